@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
+from cachetools import TTLCache
 from datetime import timedelta
+import hashlib
+import time
 
 from backend.app.api.v1 import schemas
 from backend.app.core import security
@@ -10,7 +13,29 @@ from backend.app.db import users
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
+class _BearerTokenScheme(OAuth2PasswordBearer):
+    """
+    OAuth2PasswordBearer with a fast path for the canonical "Bearer <token>"
+    header: a prefix check and slice instead of Starlette's generic scheme/param
+    parsing. Anything else (other casing, missing header) falls through to the
+    standard handling, so error responses and the OpenAPI schema are unchanged.
+    """
+    async def __call__(self, request: Request) -> str | None:
+        authorization = request.headers.get("authorization", "")
+        if authorization.startswith("Bearer "):
+            return authorization[7:]
+        return await super().__call__(request)
+
+oauth2_scheme = _BearerTokenScheme(tokenUrl="/api/v1/auth/token")
+
+# Signature-verified token payloads keyed by a digest of the token. Verifying the
+# signature is the expensive part of jwt.decode, so it runs once per token; the
+# cheap `exp` check is still evaluated on every request. Only payloads that
+# passed verification are ever inserted.
+_verified_tokens: TTLCache = TTLCache(maxsize=10_000, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
 
 def authenticate_user(email: str, password: str):
     user = users.get_user(email)
@@ -26,23 +51,31 @@ async def get_current_active_user(token: str = Depends(oauth2_scheme)) -> schema
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    cache_key = _token_cache_key(token)
+    payload = _verified_tokens.get(cache_key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
+        if "exp" in payload:
+            _verified_tokens[cache_key] = payload
+    elif payload["exp"] <= time.time():
+        _verified_tokens.pop(cache_key, None)
+        raise credentials_exception
+
+    email: str | None = payload.get("sub")
+    if email is None:
         raise credentials_exception
     
-    user = users.get_user(email=token_data.email)
+    user = users.get_user_object(email)
     if user is None:
         raise credentials_exception
     
-    if user.get("disabled"):
+    if user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    return schemas.User(**user)
+    return user
 
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
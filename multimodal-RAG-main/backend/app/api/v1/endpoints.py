@@ -1,22 +1,46 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
 from backend.app.core.config import Settings, settings
-from backend.app.services.embedding import embedding_service, EmbeddingService
-from backend.app.services.vector_db import vector_db_service, VectorDBService, KBType
-from backend.app.services.parser import document_service, DocumentService
-from backend.app.services.storage_service import storage_service, StorageService
-from backend.app.services.llm_gen import generative_service, GenerativeService
-from backend.app.services.rag_pipeline import RAGPipelineService
+from backend.app.core.hashing import content_hash, file_content_hash
+from backend.app.core.responses import ORJSONResponse
+from backend.app.services.embedding import get_embedding_service, EmbeddingService
+from backend.app.services.vector_db import get_vector_db_service, VectorDBService, KBType
+from backend.app.services.parser import get_document_service, DocumentService
+from backend.app.services.storage_service import get_storage_service, StorageService
+from backend.app.services.rag_pipeline import get_rag_pipeline_service, RAGPipelineService
+from backend.app.services.query_cache import get_query_cache, SemanticQueryCache
 from backend.app.api.v1.auth import get_current_active_user
 from backend.app.api.v1 import schemas
 from PIL import Image
-import hashlib
+import asyncio
 import io
+from typing import IO, Tuple
 
 router = APIRouter()
 
+async def get_settings() -> Settings:
+    # Declared async so FastAPI resolves it on the event loop instead of
+    # dispatching a sync dependency to the threadpool on every request.
+    return settings
+
 @router.get("/", response_model=schemas.HealthCheck)
-def home(app_settings: Settings = Depends(lambda: settings)):
-    return {"message": "I am the medical chatbot!.how can i help you?", "google_api_key_loaded": bool(app_settings.GOOGLE_API_KEY)}
+async def home(app_settings: Settings = Depends(get_settings)):
+    # Handlers build their payloads in the response_model shape already, so they return
+    # ORJSONResponse directly; the response_model only documents the schema.
+    return ORJSONResponse({"message": "I am the medical chatbot!.how can i help you?", "google_api_key_loaded": bool(app_settings.GOOGLE_API_KEY)})
+
+def _load_uploaded_image(file_obj: IO[bytes]) -> Tuple[Image.Image, str]:
+    """
+    Hashes and fully decodes an uploaded image without copying the upload into
+    memory. The file is rewound afterwards so it can be read again for upload.
+    """
+    file_obj.seek(0)
+    image_hash = file_content_hash(file_obj)
+    file_obj.seek(0)
+    pil_image = Image.open(file_obj)
+    # Decode now: afterwards the image no longer reads from file_obj
+    pil_image.load()
+    file_obj.seek(0)
+    return pil_image, image_hash
 
 @router.post("/embeddings/", response_model=schemas.EmbeddingResponse)
 async def create_embedding(
@@ -24,9 +48,10 @@ async def create_embedding(
     image: UploadFile | None = File(None),
     kb_type: KBType = Form(KBType.GKB),
     current_user: schemas.User = Depends(get_current_active_user),
-    embed_service: EmbeddingService = Depends(lambda: embedding_service),
-    db_service: VectorDBService = Depends(lambda: vector_db_service),
-    store_service: StorageService = Depends(lambda: storage_service),
+    embed_service: EmbeddingService = Depends(get_embedding_service),
+    db_service: VectorDBService = Depends(get_vector_db_service),
+    store_service: StorageService = Depends(get_storage_service),
+    q_cache: SemanticQueryCache = Depends(get_query_cache),
 ):
     """
     Creates a vector embedding and upserts it into the appropriate knowledge base (GKB or SKB).
@@ -51,38 +76,43 @@ async def create_embedding(
     try:
         if text:
             source_type = "text"
-            object_name = f"text/{context_id or 'gkb'}/{hashlib.md5(text.encode()).hexdigest()}.txt"
+            object_name = f"text/{context_id or 'gkb'}/{content_hash(text.encode())}.txt"
             source_id = f"s3://{store_service.bucket_name}/{object_name}"
             
-            if not store_service.upload_file(io.BytesIO(text.encode('utf-8')), object_name):
+            # Upload and embed concurrently; the two don't depend on each other
+            uploaded, embedding = await asyncio.gather(
+                # The object name is content-addressed, so an existing object is identical
+                asyncio.wrap_future(store_service.upload_file_async(io.BytesIO(text.encode('utf-8')), object_name, skip_if_exists=True)),
+                asyncio.to_thread(embed_service.create_text_embedding, text),
+            )
+            if not uploaded:
                 raise HTTPException(status_code=500, detail="Failed to upload text to cloud storage.")
-
-            embedding = embed_service.create_text_embedding(text)
         elif image:
             source_type = "image"
             object_name = f"images/{context_id or 'gkb'}/{image.filename or 'unknown'}"
             source_id = f"s3://{store_service.bucket_name}/{object_name}"
             
-            contents = await image.read()
-            file_stream = io.BytesIO(contents)
-            
-            if not store_service.upload_file(file_stream, object_name):
+            # Hash and decode straight from the upload's spooled file, then hand the
+            # same (rewound) file to S3 while the model runs on the decoded pixels
+            pil_image, image_hash = await asyncio.to_thread(_load_uploaded_image, image.file)
+            uploaded, embedding = await asyncio.gather(
+                asyncio.wrap_future(store_service.upload_file_async(image.file, object_name)),
+                asyncio.to_thread(embed_service.create_image_embedding, pil_image, image_hash),
+            )
+            if not uploaded:
                 raise HTTPException(status_code=500, detail="Failed to upload image to cloud storage.")
-            
-            # Reset the stream's position to the beginning before reading it again for PIL
-            file_stream.seek(0)
-            pil_image = Image.open(file_stream)
-            embedding = embed_service.create_image_embedding(pil_image)
 
-        vector_id = db_service.upsert(embedding, kb_type, source_type, source_id, context_id)
-        return {"status": "success", "vector_id": vector_id, "kb_type": kb_type, "context_id": context_id}
+        vector_id = await asyncio.to_thread(db_service.upsert, embedding, kb_type, source_type, source_id, context_id)
+        # Cached answers for this knowledge base may now be missing the new context
+        q_cache.invalidate(kb_type, context_id)
+        return ORJSONResponse({"status": "success", "vector_id": vector_id, "kb_type": kb_type, "context_id": context_id})
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)) from e
 
 @router.post("/documents/extract/", response_model=schemas.ExtractionResponse)
 async def extract_from_document(
     file: UploadFile = File(...),
-    doc_service: DocumentService = Depends(lambda: document_service)
+    doc_service: DocumentService = Depends(get_document_service)
 ):
     """
     Extracts text and images from an uploaded document (currently supports PDF).
@@ -91,11 +121,10 @@ async def extract_from_document(
         raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported file type. Please upload a PDF.")
 
     try:
-        contents = await file.read()
-        file_stream = io.BytesIO(contents)
-        
-        text, images = doc_service.extract_from_pdf(file_stream)
-        return {"filename": file.filename, "text_length": len(text), "image_count": len(images)}
+        # Parse straight from the upload's spooled temp file instead of copying it into memory
+        file.file.seek(0)
+        text, images = await asyncio.to_thread(doc_service.extract_from_pdf, file.file)
+        return ORJSONResponse({"filename": file.filename, "text_length": len(text), "image_count": len(images)})
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to process PDF: {e}") from e
 
@@ -104,29 +133,29 @@ async def perform_query(
     query: str = Form(...),
     kb_type: KBType = Form(KBType.GKB),
     current_user: schemas.User = Depends(get_current_active_user),
-    embed_service: EmbeddingService = Depends(lambda: embedding_service),
-    db_service: VectorDBService = Depends(lambda: vector_db_service),
-    store_service: StorageService = Depends(lambda: storage_service),
-    gen_service: GenerativeService = Depends(lambda: generative_service),
+    embed_service: EmbeddingService = Depends(get_embedding_service),
+    pipeline: RAGPipelineService = Depends(get_rag_pipeline_service),
+    q_cache: SemanticQueryCache = Depends(get_query_cache),
 ):
     """
     Performs a full RAG query:
     Orchestrates the RAG pipeline to retrieve context and generate a final answer.
+    Answers to near-identical recent queries are served from the semantic cache.
     """
     try:
         context_id = None
         if kb_type == KBType.SKB:
             context_id = current_user.email
 
-        # Initialize the pipeline service with all its dependencies
-        pipeline = RAGPipelineService(
-            embedding_service=embed_service,
-            vector_db_service=db_service,
-            storage_service=store_service,
-            generative_service=gen_service,
-        )
-        # Run the pipeline
-        result = pipeline.run_pipeline(query, kb_type, context_id)
-        return result
+        # The query embedding is needed by the pipeline anyway, so probe the cache with it first
+        query_vector = await asyncio.to_thread(embed_service.create_text_embedding, query)
+        generation = q_cache.generation(kb_type, context_id)
+        cached = q_cache.get(query_vector, kb_type, context_id)
+        if cached is not None:
+            return ORJSONResponse({**cached, "query": query})
+
+        result = await pipeline.run_pipeline(query, kb_type, context_id, query_vector)
+        q_cache.set(query_vector, kb_type, context_id, result, generation)
+        return ORJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)) from e
\ No newline at end of file
@@ -1,16 +1,11 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
+# Re-exported so the API layer can keep referring to schemas.User
+from backend.app.db.models import UserBase as UserBase, User as User
 from backend.app.services.vector_db import KBType
 
 # --- User and Token Schemas ---
 
-class UserBase(BaseModel):
-    email: str
-
-class User(UserBase):
-    full_name: str | None = None
-    disabled: bool | None = None
-
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,4 +1,4 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
 class Settings(BaseSettings):
@@ -11,6 +11,10 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: str
     PINECONE_ENVIRONMENT: str | None = None
     PINECONE_INDEX_NAME: str = "multi-rag-index"
+    # Directory where the in-memory fallback index persists its vectors, so they
+    # survive restarts; unset keeps it in memory only. Only one process can use a
+    # given path (it is locked), so run the API with a single worker when set.
+    INMEMORY_INDEX_PATH: str | None = None
 
     # Google Generative AI settings
     GOOGLE_API_KEY: str
@@ -25,11 +29,24 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str | None = None
     AWS_REGION: str | None = None
     S3_BUCKET_NAME: str | None = None
+    # Total size of downloaded S3 objects kept in memory for reuse across queries
+    STORAGE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # How long a cached object is served before it is fetched again, which bounds
+    # staleness when another process overwrites it
+    STORAGE_CACHE_TTL_SECONDS: int = 300
 
-    class Config:
-        # This tells Pydantic to look for a .env file
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+    # Worker threads behind asyncio.to_thread. They run blocking network calls
+    # (Gemini, Pinecone, S3) as well as CPU work that releases the GIL (CLIP,
+    # image decoding), so size it for concurrent requests rather than cores
+    DEFAULT_EXECUTOR_WORKERS: int = 32
+
+    # Semantic query cache settings. The cache is per process, so with several
+    # workers or after a bulk ingest, answers can lag new knowledge by up to the TTL
+    QUERY_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    QUERY_CACHE_TTL_SECONDS: int = 300
+
+    # This tells Pydantic to look for a .env file
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 # Create a single, reusable instance of the settings
 # Load values from a local .env file (if present) into the environment
@@ -0,0 +1,23 @@
+from typing import IO
+
+import blake3
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Returns a 128-bit hex digest of the given bytes.
+    The digest only names content-addressed objects in storage, so a fast
+    non-cryptographic-grade choice is fine; BLAKE3 hashes several GB/s.
+    """
+    return blake3.blake3(data).hexdigest(16)
+
+
+def file_content_hash(file_obj: IO[bytes], chunk_size: int = 1 << 20) -> str:
+    """
+    Same digest as content_hash, computed by streaming the file object from its
+    current position in `chunk_size` reads instead of materializing it.
+    """
+    hasher = blake3.blake3()
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        hasher.update(chunk)
+    return hasher.hexdigest(16)
@@ -0,0 +1,14 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    A JSON response rendered with orjson, which also serializes enums and NumPy
+    values natively. Handlers that already build a payload of the right shape can
+    return it directly to skip FastAPI's response_model validation pass.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,12 @@
+import numpy as np
+
+# Floor for L2 norms, so an all-zero vector normalizes to zeros instead of
+# dividing by zero (numba raises ZeroDivisionError, NumPy would return nan)
+NORM_EPS = 1e-12
+
+
+def l2_normalize(x: np.ndarray, axis: int = -1) -> np.ndarray:
+    """
+    Returns `x` scaled to unit L2 norm along `axis`; zero vectors stay zero.
+    """
+    return x / np.maximum(np.linalg.norm(x, axis=axis, keepdims=True), NORM_EPS)
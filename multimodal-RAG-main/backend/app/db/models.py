@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+# --- User models ---
+# Defined here so the user store doesn't depend on the API layer; the API
+# schemas re-export them.
+
+class UserBase(BaseModel):
+    email: str
+
+class User(UserBase):
+    full_name: str | None = None
+    disabled: bool | None = None
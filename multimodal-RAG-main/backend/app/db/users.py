@@ -2,6 +2,7 @@
 User database module - provides basic user management functions.
 This is a stub implementation; replace with real database queries as needed.
 """
+from backend.app.db.models import User
 
 # Mock user database (in production, this would be a real database)
 _users_db = {
@@ -10,9 +11,31 @@ _users_db = {
         "full_name": "Test User",
         "hashed_password": "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lm",  # password: "secret"
         "disabled": False,
-    }
+    },
+    "user@example.com": {
+        "email": "user@example.com",
+        "full_name": "Example User",
+        "hashed_password": "$2b$12$EgcSpDk/T3v33VejOgETTOGV0mbQ9afGTM.yaIyaFL.71SKYhrmAG",  # password: "password123"
+        "disabled": False,
+    },
 }
 
+# Validated User models, built once per record (and rebuilt when the record
+# changes) so authenticated requests don't re-run Pydantic validation each time.
+_user_objects: dict[str, User] = {}
+
+
+def _refresh_user_object(email: str) -> None:
+    user = _users_db.get(email)
+    if user is None:
+        _user_objects.pop(email, None)
+    else:
+        _user_objects[email] = User(**user)
+
+
+for _email in _users_db:
+    _refresh_user_object(_email)
+
 
 def get_user(email: str) -> dict | None:
     """
@@ -27,6 +50,19 @@ def get_user(email: str) -> dict | None:
     return _users_db.get(email)
 
 
+def get_user_object(email: str) -> User | None:
+    """
+    Retrieve the prebuilt User model for an email.
+    
+    Args:
+        email: The user's email address
+        
+    Returns:
+        The shared User instance (treat as read-only) or None if not found
+    """
+    return _user_objects.get(email)
+
+
 def create_user(email: str, full_name: str, hashed_password: str) -> dict:
     """
     Create a new user in the database.
@@ -46,6 +82,7 @@ def create_user(email: str, full_name: str, hashed_password: str) -> dict:
         "disabled": False,
     }
     _users_db[email] = user
+    _refresh_user_object(email)
     return user
 
 
@@ -63,6 +100,7 @@ def update_user(email: str, **kwargs) -> dict | None:
     user = _users_db.get(email)
     if user:
         user.update(kwargs)
+        _refresh_user_object(email)
     return user
 
 
@@ -78,5 +116,6 @@ def delete_user(email: str) -> bool:
     """
     if email in _users_db:
         del _users_db[email]
+        _refresh_user_object(email)
         return True
     return False
@@ -1,29 +1,61 @@
+import asyncio
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from backend.app.api.v1 import endpoints
 from backend.app.api.v1 import auth
-
-# Import service instances to ensure they are initialized on startup
-from backend.app.services.embedding import embedding_service
-from backend.app.services.vector_db import vector_db_service
-from backend.app.services.storage_service import storage_service
-from backend.app.services.llm_gen import generative_service
-from backend.app.services.parser import document_service
-
-# Reference the instances so static analysis doesn't flag them as unused
-_services = (embedding_service, vector_db_service, storage_service, generative_service, document_service)
+from backend.app.core.config import settings
+from backend.app.core.responses import ORJSONResponse
+from backend.app.services.embedding import get_embedding_service
+from backend.app.services.vector_db import get_vector_db_service
+from backend.app.services.storage_service import get_storage_service
+from backend.app.services.llm_gen import get_generative_service
+from backend.app.services.parser import get_document_service
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _warm_services():
+    """
+    Creates the shared services ahead of the first request. A failure is only
+    logged; the service is retried lazily by the first request that needs it.
+    """
+    for get_service in (get_embedding_service, get_vector_db_service, get_storage_service,
+                        get_generative_service, get_document_service):
+        try:
+            get_service()
+        except Exception as e:
+            logger.error(f"Failed to initialize {get_service.__name__}: {e}")
+    logger.info("Services initialized.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan. Services (notably the CLIP model) are loaded in the
+    background so the server starts accepting connections immediately; requests
+    that arrive earlier simply wait for the service they depend on.
+    """
+    logger.info("--- Application Startup ---")
+    # Downloads, image decoding, embedding and LLM calls all run through
+    # asyncio.to_thread; don't leave the pool size to the CPU count
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.DEFAULT_EXECUTOR_WORKERS, thread_name_prefix="to-thread")
+    )
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(_warm_services))
+    yield
+    await app.state.warmup
+
 # Create the main FastAPI app instance.
 app = FastAPI(
+    lifespan=lifespan,
     title="Multi-RAG API",
     description="A multi-modal RAG API using FastAPI, Pinecone, and Google Gemini.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add middleware
@@ -39,15 +71,6 @@ async def add_process_time_header(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
-@app.on_event("startup")
-async def startup_event():
-    """
-    Application startup event. This is where you can initialize resources.
-    """
-    logger.info("--- Application Startup ---")
-    # By importing the service instances, we ensure they are initialized.
-    logger.info("Services are being initialized...")
-
 # --- Mount API Routers ---
 # This includes all the core application routes (query, embeddings, etc.)
 # from the 'endpoints.py' module under the /api/v1 prefix.
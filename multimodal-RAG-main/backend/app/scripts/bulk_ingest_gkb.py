@@ -2,83 +2,170 @@ import argparse
 import os
 import sys
 import io
-import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from PIL import Image
 
 # Add the project root to the Python path to allow importing app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from backend.app.services.parser import document_service
-from backend.app.services.embedding import embedding_service
-from backend.app.services.storage_service import storage_service
-from backend.app.services.vector_db import vector_db_service, KBType
+from backend.app.core.hashing import content_hash
+from backend.app.services.parser import get_document_service
+from backend.app.services.embedding import get_embedding_service
+from backend.app.services.storage_service import get_storage_service
+from backend.app.services.vector_db import get_vector_db_service, KBType
 
-def process_pdf(file_path: Path):
+# Embeddings are flushed once this many items are queued, or when no PDF
+# finished within FLUSH_INTERVAL_SECONDS, whichever comes first.
+EMBED_BATCH_SIZE = 32
+FLUSH_INTERVAL_SECONDS = 0.2
+
+def extract_and_upload(file_path: Path) -> dict | None:
     """
-    Processes a single PDF file: extracts content, uploads to S3, creates embeddings,
-    and upserts to the vector database as part of the Global Knowledge Base (GKB).
+    Runs in a worker process: extracts the content of a single PDF file and
+    uploads it to S3. Returns the uploaded text and images so the parent process
+    can embed them, or None if the file could not be processed.
     """
     print(f"\n--- Processing PDF: {file_path.name} ---")
-
-    if not storage_service.is_enabled:
-        print("ERROR: Storage service is not configured. Cannot upload files. Aborting.")
-        return
+    document_service = get_document_service()
+    storage_service = get_storage_service()
 
     try:
-        with open(file_path, "rb") as f:
-            file_stream = io.BytesIO(f.read())
-
-        # 1. Extract content from PDF
-        text, images = document_service.extract_from_pdf(file_stream)
+        # 1. Extract content from PDF (read from disk by PyMuPDF on demand)
+        text, images = document_service.extract_from_pdf(str(file_path))
         print(f"Extracted {len(text)} characters of text and {len(images)} images.")
 
-        # 2. Process and ingest the extracted text
+        # 2. Upload the extracted text. Uploads run concurrently and are joined below;
+        # object names are content-addressed, so anything already in S3 is skipped.
+        uploads = []
+        texts = []
         if text.strip():
-            text_hash = hashlib.md5(text.encode()).hexdigest()
+            text_hash = content_hash(text.encode())
             text_object_name = f"text/gkb/{text_hash}.txt"
             s3_uri = f"s3://{storage_service.bucket_name}/{text_object_name}"
 
-            # Upload text to S3
-            storage_service.upload_file(io.BytesIO(text.encode('utf-8')), text_object_name)
-
-            # Create embedding and upsert to Pinecone
-            print(f"Ingesting text content (S3 URI: {s3_uri})")
-            text_embedding = embedding_service.create_text_embedding(text)
-            vector_db_service.upsert(
-                vector=text_embedding,
-                kb_type=KBType.GKB,
-                source_type="text",
-                source_id=s3_uri,
-                context_id="gkb_default" # GKB items belong to a default context
-            )
+            uploads.append(storage_service.upload_file_async(io.BytesIO(text.encode('utf-8')), text_object_name, skip_if_exists=True))
+            texts.append((s3_uri, text))
 
-        # 3. Process and ingest each extracted image
-        for i, img in enumerate(images):
-            img_hash = hashlib.md5(img.tobytes()).hexdigest()
+        # 3. Upload each extracted image as-is
+        uploaded_images = []
+        for i, (image_bytes, ext) in enumerate(images):
+            # Hash and upload the encoded bytes straight from the PDF; no decode/re-encode
+            img_hash = content_hash(image_bytes)
             # Use the original PDF name to provide more context in the filename
-            img_object_name = f"images/gkb/{file_path.stem}_{i}_{img_hash}.png"
+            img_object_name = f"images/gkb/{file_path.stem}_{i}_{img_hash}.{ext}"
             s3_uri = f"s3://{storage_service.bucket_name}/{img_object_name}"
 
-            # Convert PIL image to byte stream for uploading
-            with io.BytesIO() as img_stream:
-                img.save(img_stream, format='PNG')
-                img_stream.seek(0)
-                storage_service.upload_file(img_stream, img_object_name)
-
-            # Create embedding and upsert to Pinecone
-            print(f"Ingesting image {i+1} (S3 URI: {s3_uri})")
-            image_embedding = embedding_service.create_image_embedding(img)
-            vector_db_service.upsert(
-                vector=image_embedding,
-                kb_type=KBType.GKB,
-                source_type="image",
-                source_id=s3_uri,
-                context_id="gkb_default"
-            )
-        
-        print(f"Successfully processed and ingested {file_path.name}")
+            uploads.append(storage_service.upload_file_async(io.BytesIO(image_bytes), img_object_name, skip_if_exists=True))
+            uploaded_images.append((s3_uri, img_hash, image_bytes))
+
+        failed = sum(not upload.result() for upload in uploads)
+        if failed:
+            print(f"WARNING: {failed} upload(s) failed for {file_path.name}.")
+        print(f"Uploaded content of {file_path.name}")
+        return {"texts": texts, "images": uploaded_images}
     except (OSError, ValueError, RuntimeError) as e:
         print(f"ERROR: Failed to process {file_path.name}. Reason: {e}")
+        return None
+
+def _embed_with_fallback(items: list, embed_batch, describe) -> list:
+    """
+    Embeds `items` in one batched call. Batches mix content from several PDFs, so
+    if the batch fails each item is retried on its own and only the bad ones
+    (e.g. a truncated image) are skipped; their embedding is None.
+    """
+    try:
+        return list(embed_batch(items))
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"WARNING: Embedding a batch of {len(items)} item(s) failed ({e}); retrying them one at a time.")
+
+    embeddings = []
+    for item in items:
+        try:
+            embeddings.append(embed_batch([item])[0])
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"ERROR: Skipping {describe(item)}. Reason: {e}")
+            embeddings.append(None)
+    return embeddings
+
+def _upsert(s3_uri: str, source_type: str, embedding) -> None:
+    try:
+        get_vector_db_service().upsert(
+            vector=embedding,
+            kb_type=KBType.GKB,
+            source_type=source_type,
+            source_id=s3_uri,
+            context_id="gkb_default" # GKB items belong to a default context
+        )
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"ERROR: Failed to upsert {source_type} {s3_uri}. Reason: {e}")
+
+def embed_and_upsert(texts: list[tuple[str, str]], images: list[tuple[str, str, bytes]]):
+    """
+    Creates embeddings for uploaded content in batched forward passes and upserts
+    them to the vector database as part of the Global Knowledge Base (GKB).
+    """
+    embedding_service = get_embedding_service()
+
+    if texts:
+        print(f"Embedding {len(texts)} text item(s)")
+        text_embeddings = _embed_with_fallback(
+            texts,
+            lambda batch: embedding_service.create_text_embeddings_batch([text for _, text in batch]),
+            lambda item: f"text {item[0]}",
+        )
+        for (s3_uri, _), text_embedding in zip(texts, text_embeddings):
+            if text_embedding is not None:
+                print(f"Ingesting text content (S3 URI: {s3_uri})")
+                _upsert(s3_uri, "text", text_embedding)
+
+    if images:
+        print(f"Embedding {len(images)} image(s)")
+
+        def embed_images(batch):
+            # Image.open only reads headers; pixels are decoded just for images whose
+            # content hash misses the embedding cache
+            pil_images = [Image.open(io.BytesIO(image_bytes)) for _, _, image_bytes in batch]
+            return embedding_service.create_image_embeddings_batch(
+                pil_images, cache_keys=[img_hash for _, img_hash, _ in batch]
+            )
+
+        image_embeddings = _embed_with_fallback(images, embed_images, lambda item: f"image {item[0]}")
+        for (s3_uri, _, _), image_embedding in zip(images, image_embeddings):
+            if image_embedding is not None:
+                print(f"Ingesting image (S3 URI: {s3_uri})")
+                _upsert(s3_uri, "image", image_embedding)
+
+def ingest(pdf_files: list[Path], workers: int):
+    """
+    Parses and uploads PDFs in a process pool while this process embeds the
+    results. Content from different PDFs is accumulated into shared batches, so
+    parsing and S3 uploads overlap with embedding instead of running serially.
+    """
+    pending_texts: list[tuple[str, str]] = []
+    pending_images: list[tuple[str, str, bytes]] = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        not_done = {pool.submit(extract_and_upload, pdf_file) for pdf_file in pdf_files}
+        while not_done:
+            done, not_done = wait(not_done, timeout=FLUSH_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    pending_texts.extend(result["texts"])
+                    pending_images.extend(result["images"])
+
+            # Flush full batches as they fill up, and everything else once the
+            # workers have gone quiet for a whole flush interval
+            while len(pending_texts) >= EMBED_BATCH_SIZE:
+                embed_and_upsert(pending_texts[:EMBED_BATCH_SIZE], [])
+                del pending_texts[:EMBED_BATCH_SIZE]
+            while len(pending_images) >= EMBED_BATCH_SIZE:
+                embed_and_upsert([], pending_images[:EMBED_BATCH_SIZE])
+                del pending_images[:EMBED_BATCH_SIZE]
+            if not done or not not_done:
+                embed_and_upsert(pending_texts, pending_images)
+                pending_texts, pending_images = [], []
 
 def main():
     """
@@ -86,6 +173,7 @@ def main():
     """
     parser = argparse.ArgumentParser(description="Bulk ingest documents into the Global Knowledge Base (GKB).")
     parser.add_argument("path", type=str, help="Path to a single PDF file or a directory containing PDFs.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of processes used to parse and upload PDFs.")
     args = parser.parse_args()
 
     source_path = Path(args.path)
@@ -93,20 +181,24 @@ def main():
         print(f"Error: The path '{source_path}' does not exist.")
         sys.exit(1)
 
+    if not get_storage_service().is_enabled:
+        print("ERROR: Storage service is not configured. Cannot upload files. Aborting.")
+        return
+
     pdf_files = []
     if source_path.is_dir():
         print(f"Scanning directory '{source_path}' for PDF files...")
         pdf_files.extend(source_path.rglob("*.pdf"))
     elif source_path.is_file() and source_path.suffix.lower() == ".pdf":
         pdf_files.append(source_path)
-    
+
     if not pdf_files:
         print("No PDF files found to process.")
         return
 
     print(f"Found {len(pdf_files)} PDF file(s) to ingest.")
-    for pdf_file in pdf_files:
-        process_pdf(pdf_file)
+    ingest(pdf_files, workers=max(1, min(args.workers or 1, len(pdf_files))))
+    print(f"Finished ingesting {len(pdf_files)} PDF file(s).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,50 +1,189 @@
+import threading
+import numpy as np
 import torch
+from cachetools import LRUCache
 from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
+from backend.app.core.hashing import content_hash
+from backend.app.core.vectors import NORM_EPS, l2_normalize
+
+try:
+    from numba import njit  # type: ignore
+except ImportError:
+    njit = None
+
+def _normalize_rows_numpy(x: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes each row of a 2-D float32 matrix into a new array.
+    """
+    return l2_normalize(x, axis=1)
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _normalize_rows(x: np.ndarray) -> np.ndarray:
+        """
+        L2-normalizes each row of a 2-D float32 matrix into a new array.
+        """
+        out = np.empty_like(x)
+        for i in range(x.shape[0]):
+            s = 0.0
+            for j in range(x.shape[1]):
+                s += x[i, j] * x[i, j]
+            # Same floor as l2_normalize, so a zero row stays zero
+            inv = 1.0 / max(np.sqrt(s), NORM_EPS)
+            for j in range(x.shape[1]):
+                out[i, j] = x[i, j] * inv
+        return out
+else:
+    _normalize_rows = _normalize_rows_numpy
 
 class EmbeddingService:
     """
     A service to handle the creation of text and image embeddings using a CLIP model.
     The model is loaded once during initialization.
+    Embeddings are memoized in an LRU cache keyed by content hash, so re-embedding
+    the same text or image (re-ingests, repeated queries) skips the forward pass.
+    Texts are normalized (case, whitespace) before hashing.
     """
-    def __init__(self):
+    def __init__(self, cache_size: int = 4096):
         """
         Initializes the EmbeddingService by loading the CLIP model and processor.
         This is a heavy operation and should only be done once.
         """
         model_name = "openai/clip-vit-base-patch32"
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"EmbeddingService: Loading model '{model_name}' onto device '{self.device}'")
+        # Half precision halves memory traffic and runs on tensor cores; cosine
+        # similarity between normalized embeddings is insensitive to the lost bits.
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+        print(f"EmbeddingService: Loading model '{model_name}' onto device '{self.device}' ({self.dtype})")
 
-        self.model = CLIPModel.from_pretrained(model_name).to(self.device)
+        self.model = CLIPModel.from_pretrained(model_name).to(self.device, dtype=self.dtype)
+        self.model.eval()
         self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.dimension = self.model.config.projection_dim
         print("EmbeddingService: CLIP model and processor loaded successfully.")
 
-    def create_text_embedding(self, text: str) -> list[float]:
+        self._cache: LRUCache = LRUCache(maxsize=cache_size)
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def _text_cache_key(text: str) -> str:
+        # CLIP's tokenizer lowercases and collapses whitespace itself, so texts that
+        # differ only in case or spacing embed identically and can share an entry
+        normalized = " ".join(text.lower().split())
+        return "text:" + content_hash(normalized.encode())
+
+    @staticmethod
+    def _image_cache_key(cache_key: str | None) -> str | None:
+        return None if cache_key is None else "image:" + cache_key
+
+    def _cached(self, key: str | None) -> np.ndarray | None:
+        if key is None:
+            return None
+        with self._cache_lock:
+            return self._cache.get(key)
+
+    def _remember(self, key: str | None, embedding: np.ndarray) -> None:
+        if key is not None:
+            # Cache a private, read-only copy so callers can't mutate cached vectors
+            embedding = embedding.copy()
+            embedding.flags.writeable = False
+            with self._cache_lock:
+                self._cache[key] = embedding
+
+    def _text_features(self, texts: list[str]) -> torch.Tensor:
+        """
+        Runs the text tower and returns the raw (unnormalized) features. Texts
+        longer than CLIP's context (77 tokens) are truncated rather than failing.
+        """
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        with torch.inference_mode():
+            return self.model.get_text_features(**inputs)
+
+    def _image_features(self, images: list[Image.Image]) -> torch.Tensor:
+        """
+        Runs the vision tower and returns L2-normalized float32 features.
+        """
+        # Ensure images are in RGB format
+        images = [image.convert("RGB") for image in images]
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        inputs["pixel_values"] = inputs["pixel_values"].to(self.dtype)
+        with torch.inference_mode():
+            return self.model.get_image_features(**inputs)
+
+    def _embed(self, items: list, keys: list[str | None], features_fn, batch_size: int) -> np.ndarray:
+        """
+        Fills a (len(items), dimension) float32 matrix from the cache, running
+        `features_fn` in batches of `batch_size` over the items that missed.
+        """
+        embeddings = np.empty((len(items), self.dimension), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self._cached(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            # One device-to-host copy per batch (in the model dtype, so fp16 on GPU
+            # halves the transfer), then upcast and normalize on the host
+            features = _normalize_rows(features_fn([items[i] for i in chunk]).cpu().float().numpy())
+            embeddings[chunk] = features
+            for i, row in zip(chunk, features):
+                self._remember(keys[i], row)
+        return embeddings
+
+    def create_text_embedding(self, text: str) -> np.ndarray:
         """
         Creates a vector embedding for a given text string.
+        Returns a float32 array of shape (dimension,).
         """
-        inputs = self.processor(text=[text], return_tensors="pt", padding=True).to(self.device)
-        with torch.no_grad():
-            text_features = self.model.get_text_features(**inputs)
-        
-        # Normalize the features and convert to a standard Python list
-        text_features /= text_features.norm(dim=-1, keepdim=True)
-        return text_features.cpu().numpy().flatten().tolist()
+        return self._embed([text], [self._text_cache_key(text)], self._text_features, 1)[0]
 
-    def create_image_embedding(self, image: Image.Image) -> list[float]:
+    def create_image_embedding(self, image: Image.Image, cache_key: str | None = None) -> np.ndarray:
         """
         Creates a vector embedding for a given PIL Image.
+        Returns a float32 array of shape (dimension,).
+        Pass `cache_key` (e.g. a hash of the encoded image bytes) to enable caching;
+        hashing the decoded pixels here would cost more than it saves.
+        """
+        return self._embed([image], [self._image_cache_key(cache_key)], self._image_features, 1)[0]
+
+    def create_text_embeddings_batch(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
         """
-        # Ensure image is in RGB format
-        image = image.convert("RGB")
-        inputs = self.processor(images=[image], return_tensors="pt").to(self.device)
-        with torch.no_grad():
-            image_features = self.model.get_image_features(**inputs)
-        
-        # Normalize the features and convert to a standard Python list
-        image_features /= image_features.norm(dim=-1, keepdim=True)
-        return image_features.cpu().numpy().flatten().tolist()
-
-# Create a single, reusable instance of the service
-embedding_service = EmbeddingService()
\ No newline at end of file
+        Creates vector embeddings for a list of text strings, running one forward
+        pass per `batch_size` uncached texts instead of one per text.
+        Returns a float32 array of shape (len(texts), dimension).
+        """
+        keys = [self._text_cache_key(text) for text in texts]
+        return self._embed(texts, keys, self._text_features, batch_size)
+
+    def create_image_embeddings_batch(
+        self, images: list[Image.Image], batch_size: int = 32, cache_keys: list[str] | None = None
+    ) -> np.ndarray:
+        """
+        Creates vector embeddings for a list of PIL Images, running one forward
+        pass per `batch_size` uncached images instead of one per image.
+        `cache_keys`, if given, holds one content hash per image (see create_image_embedding).
+        Returns a float32 array of shape (len(images), dimension).
+        """
+        keys = [self._image_cache_key(key) for key in cache_keys] if cache_keys else [None] * len(images)
+        return self._embed(images, keys, self._image_features, batch_size)
+
+# The shared instance is created on first use rather than at import: loading CLIP
+# (weights + device init) would otherwise block every importer, including app startup.
+_embedding_service: EmbeddingService | None = None
+_embedding_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """
+    Returns the shared EmbeddingService, loading the CLIP model on first use.
+    """
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
@@ -1,6 +1,7 @@
 import google.generativeai as genai
 from backend.app.core.config import settings, Settings
 import logging
+import threading
 from typing import List, Dict, Any
 
 class GenerativeService:
@@ -59,5 +60,17 @@ class GenerativeService:
         response = self.model.generate_content(prompt_parts)
         return response.text
 
-# Create a single, reusable instance of the service
-generative_service = GenerativeService(settings)
\ No newline at end of file
+# Shared instance, created on first use.
+_generative_service: GenerativeService | None = None
+_generative_service_lock = threading.Lock()
+
+def get_generative_service() -> GenerativeService:
+    """
+    Returns the shared GenerativeService, configuring the Gemini client on first use.
+    """
+    global _generative_service
+    if _generative_service is None:
+        with _generative_service_lock:
+            if _generative_service is None:
+                _generative_service = GenerativeService(settings)
+    return _generative_service
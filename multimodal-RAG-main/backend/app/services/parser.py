@@ -1,47 +1,106 @@
 import fitz  # PyMuPDF
-from PIL import Image
 import io
-from typing import Tuple, List
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import IO, Iterator, Tuple, List, Union
+
+PdfSource = Union[str, os.PathLike, IO[bytes]]
+
+@contextmanager
+def _open_pdf(source: PdfSource) -> Iterator[fitz.Document]:
+    """
+    Opens a PDF without copying it into a fresh bytes object.
+
+    Paths are handed to PyMuPDF, which reads pages from disk on demand. In-memory
+    streams (including an upload's SpooledTemporaryFile that is still held in
+    memory) are exposed as a memoryview, and disk-backed file objects are
+    memory-mapped, so only the pages touched during extraction become resident.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        pdf_document = fitz.open(source)
+        try:
+            yield pdf_document
+        finally:
+            pdf_document.close()
+        return
+
+    mapped = None
+    if isinstance(source, tempfile.SpooledTemporaryFile) and not source._rolled:
+        # fileno() would force a small upload to roll over to disk; use the
+        # underlying BytesIO instead
+        source = source._file
+    if isinstance(source, io.BytesIO):
+        view = source.getbuffer()
+    else:
+        source.flush()
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+
+    try:
+        pdf_document = fitz.open(stream=view, filetype="pdf")
+        try:
+            yield pdf_document
+        finally:
+            pdf_document.close()
+    finally:
+        # The buffer can only be released once PyMuPDF is done with it
+        view.release()
+        if mapped is not None:
+            mapped.close()
 
 class DocumentService:
     """
     A utility service to open files (like PDFs) and extract their contents.
     """
 
-    def extract_from_pdf(self, file_stream: io.BytesIO) -> Tuple[str, List[Image.Image]]:
+    def extract_from_pdf(self, source: PdfSource) -> Tuple[str, List[Tuple[bytes, str]]]:
         """
-        Extracts all text and images from a PDF file stream.
+        Extracts all text and images from a PDF file.
 
         Args:
-            file_stream: A byte stream of the PDF file.
+            source: A path to the PDF file, or a binary file-like object
+                    (e.g. io.BytesIO or an upload's temporary file) containing it.
 
         Returns:
             A tuple containing:
             - A string with all the extracted text.
-            - A list of PIL.Image objects for all extracted images.
+            - A list of (image_bytes, ext) tuples for all extracted images, holding
+              the encoded bytes as stored in the PDF and their format (e.g. 'png',
+              'jpeg'). Decoding is left to callers that actually need pixels.
         """
         text_content = ""
         image_content = []
 
-        # Open the PDF from the stream
-        pdf_document = fitz.open(stream=file_stream, filetype="pdf")
+        with _open_pdf(source) as pdf_document:
+            # Iterate through each page to extract text and images
+            for page_num in range(len(pdf_document)):
+                page = pdf_document.load_page(page_num)
 
-        # Iterate through each page to extract text and images
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            
-            # Extract text
-            text_content += page.get_text("text") + "\n"
+                # Extract text
+                text_content += page.get_text("text") + "\n"
 
-            # Extract images
-            for img in page.get_images(full=True):
-                xref = img[0]
-                base_image = pdf_document.extract_image(xref)
-                image_bytes = base_image["image"]
-                pil_image = Image.open(io.BytesIO(image_bytes))
-                image_content.append(pil_image)
+                # Extract images
+                for img in page.get_images(full=True):
+                    xref = img[0]
+                    base_image = pdf_document.extract_image(xref)
+                    image_content.append((base_image["image"], base_image["ext"]))
 
         return text_content, image_content
 
-# Create a single, reusable instance of the service
-document_service = DocumentService()
\ No newline at end of file
+# Shared instance, created on first use.
+_document_service: DocumentService | None = None
+_document_service_lock = threading.Lock()
+
+def get_document_service() -> DocumentService:
+    """
+    Returns the shared DocumentService, creating it on first use.
+    """
+    global _document_service
+    if _document_service is None:
+        with _document_service_lock:
+            if _document_service is None:
+                _document_service = DocumentService()
+    return _document_service
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from backend.app.core.config import settings, Settings
+from backend.app.services.vector_db import KBType
+
+
+class _ScopeEntries:
+    """Fixed-size ring buffer of (query vector, response, timestamp) for one KB scope."""
+    def __init__(self, capacity: int, dimension: int):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.created_at = np.full(capacity, -np.inf)
+        self.responses: List[Dict[str, Any] | None] = [None] * capacity
+        self.next_slot = 0
+
+
+class SemanticQueryCache:
+    """
+    An in-process semantic cache for RAG answers.
+
+    A lookup compares the query embedding against recently answered queries in the
+    same knowledge base scope (kb_type + context_id, so SKB answers never cross
+    users) and returns the stored response when the cosine similarity clears the
+    configured threshold. Entries expire after a TTL and the oldest entry in a scope
+    is overwritten once it is full.
+
+    invalidate() only reaches this process. Other API workers and the bulk ingest
+    script keep their own view, so there an answer can miss newly added knowledge
+    for up to QUERY_CACHE_TTL_SECONDS.
+    """
+    def __init__(self, config: Settings, dimension: int = 512, max_entries_per_scope: int = 1024):
+        self.threshold = config.QUERY_CACHE_SIMILARITY_THRESHOLD
+        self.ttl_seconds = config.QUERY_CACHE_TTL_SECONDS
+        self.dimension = dimension
+        self.max_entries_per_scope = max_entries_per_scope
+        self.hits = 0
+        self.misses = 0
+        self._scopes: Dict[Tuple[str, str], _ScopeEntries] = {}
+        # Bumped by invalidate(), so an answer computed before it is not stored after it
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _scope_key(kb_type: KBType, context_id: str | None) -> Tuple[str, str]:
+        return kb_type.value, context_id or "gkb_default"
+
+    def get(self, vector: np.ndarray, kb_type: KBType, context_id: str | None = None) -> Dict[str, Any] | None:
+        """
+        Returns the cached response for the most similar recent query, or None.
+        `vector` is expected to be L2-normalized, as produced by EmbeddingService.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            entries = self._scopes.get(self._scope_key(kb_type, context_id))
+            response = None
+            if entries is not None:
+                scores = entries.vectors @ query
+                scores[entries.created_at < time.monotonic() - self.ttl_seconds] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    response = entries.responses[best]
+
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            hits, misses = self.hits, self.misses
+
+        logging.info("SemanticQueryCache: %s (hits=%d, misses=%d)", "hit" if response else "miss", hits, misses)
+        return response
+
+    def generation(self, kb_type: KBType, context_id: str | None = None) -> int:
+        """
+        Returns the scope's invalidation count; read it before computing an answer
+        and pass it to set().
+        """
+        with self._lock:
+            return self._generations.get(self._scope_key(kb_type, context_id), 0)
+
+    def set(self, vector: np.ndarray, kb_type: KBType, context_id: str | None, response: Dict[str, Any], generation: int) -> None:
+        """
+        Stores the response for a query embedding in its knowledge base scope,
+        unless the scope was invalidated since `generation` was read.
+        """
+        key = self._scope_key(kb_type, context_id)
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return
+            entries = self._scopes.get(key)
+            if entries is None:
+                entries = self._scopes[key] = _ScopeEntries(self.max_entries_per_scope, self.dimension)
+            slot = entries.next_slot
+            entries.vectors[slot] = vector
+            entries.responses[slot] = response
+            entries.created_at[slot] = time.monotonic()
+            entries.next_slot = (slot + 1) % self.max_entries_per_scope
+
+    def invalidate(self, kb_type: KBType, context_id: str | None = None) -> None:
+        """
+        Drops every cached answer in a scope, e.g. after new knowledge was added to it.
+        """
+        key = self._scope_key(kb_type, context_id)
+        with self._lock:
+            self._scopes.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+# Shared instance, created on first use.
+_query_cache: SemanticQueryCache | None = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> SemanticQueryCache:
+    """
+    Returns the shared SemanticQueryCache, creating it on first use.
+    """
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = SemanticQueryCache(settings)
+    return _query_cache
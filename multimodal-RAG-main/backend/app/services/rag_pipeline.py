@@ -1,14 +1,38 @@
-from .embedding import EmbeddingService
-from .vector_db import VectorDBService, KBType
-from .storage_service import StorageService
-from .llm_gen import GenerativeService
+from .embedding import EmbeddingService, get_embedding_service
+from .vector_db import VectorDBService, KBType, get_vector_db_service
+from .storage_service import StorageService, get_storage_service
+from .llm_gen import GenerativeService, get_generative_service
+from backend.app.core.hashing import content_hash
+from cachetools import LRUCache
 from PIL import Image
+import asyncio
+import io
+import numpy as np
 import logging
-from urllib.parse import urlparse
+import threading
+
+# Context images are decoded at roughly this resolution or above, see _decode_image
+CONTEXT_IMAGE_MAX_SIZE = (1024, 1024)
+
+# Answer returned without calling the LLM when retrieval finds nothing
+NO_CONTEXT_ANSWER = "No relevant context was found in the knowledge base for this question."
+
+def _split_s3_uri(uri: str) -> tuple[str, str]:
+    """
+    Splits an "s3://bucket/key" URI into (bucket, key). The format is fixed, so a
+    partition is enough; urlparse would also tokenize params, query and fragment.
+    """
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
 
 class RAGPipelineService:
     """
     Orchestrates the entire RAG workflow, from query to final answer.
+    Decoded context images are cached by content hash, so an image that is a top
+    hit for many queries is decoded once.
+
+    When the vector DB returns no matches the LLM is not called (the prompt asks it
+    to answer only from the context); set `answer_without_context` to call it anyway.
     """
     def __init__(
         self,
@@ -16,14 +40,99 @@ class RAGPipelineService:
         vector_db_service: VectorDBService,
         storage_service: StorageService,
         generative_service: GenerativeService,
+        image_cache_bytes: int = 256 * 1024 * 1024,
+        answer_without_context: bool = False,
     ):
         self.embedding_service = embedding_service
         self.vector_db_service = vector_db_service
         self.storage_service = storage_service
         self.generative_service = generative_service
 
-    def run_pipeline(
-        self, query: str, kb_type: KBType, context_id: str | None = None
+        # Sized by decoded pixel data, not by the compressed bytes
+        self._image_cache: LRUCache = LRUCache(
+            maxsize=image_cache_bytes,
+            getsizeof=lambda image: image.width * image.height * len(image.getbands()),
+        )
+        self._image_cache_lock = threading.Lock()
+
+        self.answer_without_context = answer_without_context
+        self.empty_retrievals = 0
+        self._empty_retrievals_lock = threading.Lock()
+
+    def _skip_generation(self, query: str, search_results: list) -> bool:
+        """
+        Whether to answer with NO_CONTEXT_ANSWER instead of running the storage
+        and LLM stages. Empty retrievals are counted and logged, since a run of
+        them usually means the index or the filters are wrong.
+        """
+        if search_results or self.answer_without_context:
+            return False
+        with self._empty_retrievals_lock:
+            self.empty_retrievals += 1
+            count = self.empty_retrievals
+        logging.warning("RAG pipeline: no matches for query '%s'; skipping generation (empty retrievals=%d)", query, count)
+        return True
+
+    def _decode_image(self, data: bytes) -> Image.Image:
+        """
+        Decodes image bytes, reusing an earlier decode of the same content.
+        Cached images are shared between requests and must not be modified.
+        """
+        key = content_hash(data)
+        with self._image_cache_lock:
+            pil_image = self._image_cache.get(key)
+        if pil_image is not None:
+            return pil_image
+
+        pil_image = Image.open(io.BytesIO(data))
+        # For JPEGs, let the decoder downscale in the DCT domain (by a power of two,
+        # never below this size); the LLM doesn't need more pixels than that
+        pil_image.draft("RGB", CONTEXT_IMAGE_MAX_SIZE)
+        pil_image.load()
+        try:
+            with self._image_cache_lock:
+                self._image_cache[key] = pil_image
+        except ValueError:
+            pass  # Larger than the whole cache
+        return pil_image
+
+    async def _fetch_context(self, match: dict) -> dict | None:
+        """
+        Downloads the stored content behind a single search match and turns it into
+        an LLM context item, or returns None if there is nothing to add.
+        """
+        metadata = match.get("metadata", {})
+        source_id = metadata.get("source_id")
+        source_type = metadata.get("source_type")
+
+        if not source_id or not source_id.startswith("s3://"):
+            return None
+
+        # Parse the S3 URI to get the object key
+        bucket, s3_path = _split_s3_uri(source_id)
+        if bucket != self.storage_service.bucket_name or not s3_path:
+            logging.warning("Skipping context %s: not an object in bucket %s.", source_id, self.storage_service.bucket_name)
+            return None
+        # Download and decode off the event loop (PIL releases the GIL while decoding)
+        return await asyncio.to_thread(self._load_context, s3_path, source_type)
+
+    def _load_context(self, s3_path: str, source_type: str | None) -> dict | None:
+        data = self.storage_service.download_bytes(s3_path)
+        if data:
+            if source_type == "image":
+                pil_image = self._decode_image(data)
+                return {"type": "image", "content": pil_image}
+            elif source_type == "text":
+                text_content = data.decode("utf-8")
+                return {"type": "text", "content": text_content}
+        return None
+
+    async def run_pipeline(
+        self,
+        query: str,
+        kb_type: KBType,
+        context_id: str | None = None,
+        query_vector: np.ndarray | None = None,
     ) -> dict:
         """
         Executes the full RAG pipeline.
@@ -32,44 +141,60 @@ class RAGPipelineService:
         2. Queries the vector DB for relevant context (both text and images).
         3. Retrieves the actual content of the context from cloud storage.
         4. Sends the query and retrieved context to an LLM to generate a final answer.
+
+        Pass `query_vector` when the caller has already embedded the query to skip step 1.
+        Blocking calls run in worker threads, and the storage downloads for all
+        matches are issued concurrently, so step 3 costs about one round-trip.
         """
         # 1. Create query embedding
         logging.info("Running RAG pipeline for query: '%s'", query)
-        query_vector = self.embedding_service.create_text_embedding(query)
+        if query_vector is None:
+            query_vector = await asyncio.to_thread(self.embedding_service.create_text_embedding, query)
 
         # 2. Query vector DB for context
-        search_results = self.vector_db_service.query(
-            query_vector, kb_type, context_id, top_k=3
-        )
+        search_results = await self.vector_db_service.aquery(query_vector, kb_type, context_id, top_k=3)
+        if self._skip_generation(query, search_results):
+            return self._format_result(query, NO_CONTEXT_ANSWER, search_results)
 
         # 3. Retrieve content from storage and format for LLM
+        context_for_llm = await self._retrieve_context(search_results)
+
+        # 4. Generate final answer
+        final_answer = await asyncio.to_thread(self.generative_service.generate_response, query, context_for_llm)
+
+        return self._format_result(query, final_answer, search_results)
+
+    async def _retrieve_context(self, search_results: list) -> list:
+        """
+        Fetches the stored content of all matches concurrently, in ranking order.
+        """
         context_for_llm = []
         if not self.storage_service.is_enabled:
             logging.warning("Storage service is disabled, cannot retrieve context from S3.")
-        else:
-            for match in search_results:
-                metadata = match.get("metadata", {})
-                source_id = metadata.get("source_id")
-                source_type = metadata.get("source_type")
-
-                if not source_id or not source_id.startswith("s3://"):
-                    continue
-
-                # Parse the S3 URI to get the object key
-                s3_path = urlparse(source_id).path.lstrip('/')
-                file_stream = self.storage_service.download_file_as_stream(s3_path)
-
-                if file_stream:
-                    if source_type == "image":
-                        pil_image = Image.open(file_stream)
-                        context_for_llm.append({"type": "image", "content": pil_image})
-                    elif source_type == "text":
-                        text_content = file_stream.read().decode("utf-8")
-                        context_for_llm.append({"type": "text", "content": text_content})
+            return context_for_llm
 
-        # 4. Generate final answer
-        final_answer = self.generative_service.generate_response(query, context_for_llm)
+        fetched = await asyncio.gather(
+            *(self._fetch_context(match) for match in search_results), return_exceptions=True
+        )
+        # gather keeps the ranking order of the matches
+        for match, item in zip(search_results, fetched):
+            if isinstance(item, Exception):
+                logging.error("Failed to retrieve context for %s: %s", match.get("id"), item)
+            elif isinstance(item, BaseException):
+                # Cancellation (and exit requests) must not be mistaken for context
+                raise item
+            elif item is not None:
+                context_for_llm.append(item)
+        return context_for_llm
+
+    async def _embed_one(self, query: str) -> np.ndarray | Exception:
+        try:
+            return await asyncio.to_thread(self.embedding_service.create_text_embedding, query)
+        except Exception as e:
+            return e
 
+    @staticmethod
+    def _format_result(query: str, final_answer: str, search_results: list) -> dict:
         return {
             "query": query,
             "answer": final_answer,
@@ -77,4 +202,157 @@ class RAGPipelineService:
                 {"id": m["id"], "score": m["score"], "metadata": m.get("metadata", {})}
                 for m in search_results
             ],
-        }
\ No newline at end of file
+        }
+
+    async def run_pipeline_batch(
+        self,
+        queries: list[str],
+        kb_type: KBType,
+        context_id: str | None = None,
+        max_batch_size: int = 32,
+        flush_interval: float = 0.05,
+        concurrency: int = 8,
+        return_exceptions: bool = False,
+    ) -> list:
+        """
+        Runs the pipeline for many queries, overlapping the stages across queries.
+
+        The stages (embed -> vector DB -> storage -> LLM) are connected by bounded
+        queues, so while one query is being answered the next ones are already being
+        searched and fetched. Queries are embedded in micro-batches of up to
+        `max_batch_size`, flushed `flush_interval` seconds after the first query of a
+        batch arrives; the other stages run `concurrency` workers each.
+
+        Returns one result per query, in input order. A failing query raises its
+        exception once the batch has drained, or with `return_exceptions=True`
+        the exception is returned in that query's slot instead.
+        """
+        loop = asyncio.get_running_loop()
+        results: list = [None] * len(queries)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=max_batch_size * 2)
+        search_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        generate_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def embed_worker():
+            while True:
+                batch = [await embed_queue.get()]
+                deadline = loop.time() + flush_interval
+                while len(batch) < max_batch_size:
+                    try:
+                        batch.append(await asyncio.wait_for(embed_queue.get(), deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                try:
+                    try:
+                        # One tokenizer call and forward pass for the whole micro-batch
+                        vectors = await asyncio.to_thread(
+                            self.embedding_service.create_text_embeddings_batch, [queries[i] for i in batch]
+                        )
+                    except Exception as e:
+                        # Don't fail unrelated queries with one bad one: embed each on its
+                        # own and record the error only for those that still fail
+                        logging.warning("RAG pipeline: embedding a batch of %d queries failed (%s); retrying one at a time", len(batch), e)
+                        vectors = [await self._embed_one(queries[i]) for i in batch]
+                    for i, vector in zip(batch, vectors):
+                        if isinstance(vector, Exception):
+                            results[i] = vector
+                        else:
+                            await search_queue.put((i, vector))
+                finally:
+                    for _ in batch:
+                        embed_queue.task_done()
+
+        async def search_worker():
+            while True:
+                i, vector = await search_queue.get()
+                try:
+                    search_results = await self.vector_db_service.aquery(vector, kb_type, context_id, top_k=3)
+                    await fetch_queue.put((i, search_results))
+                except Exception as e:
+                    results[i] = e
+                finally:
+                    search_queue.task_done()
+
+        async def fetch_worker():
+            while True:
+                i, search_results = await fetch_queue.get()
+                try:
+                    if self._skip_generation(queries[i], search_results):
+                        results[i] = self._format_result(queries[i], NO_CONTEXT_ANSWER, search_results)
+                        continue
+                    context_for_llm = await self._retrieve_context(search_results)
+                    await generate_queue.put((i, search_results, context_for_llm))
+                except Exception as e:
+                    results[i] = e
+                finally:
+                    fetch_queue.task_done()
+
+        async def generate_worker():
+            while True:
+                i, search_results, context_for_llm = await generate_queue.get()
+                try:
+                    final_answer = await asyncio.to_thread(
+                        self.generative_service.generate_response, queries[i], context_for_llm
+                    )
+                    results[i] = self._format_result(queries[i], final_answer, search_results)
+                except Exception as e:
+                    results[i] = e
+                finally:
+                    generate_queue.task_done()
+
+        workers = [asyncio.create_task(embed_worker())]
+        for worker in (search_worker, fetch_worker, generate_worker):
+            workers.extend(asyncio.create_task(worker()) for _ in range(concurrency))
+        try:
+            for i in range(len(queries)):
+                await embed_queue.put(i)
+            # Each stage only hands items downstream before marking them done, so
+            # draining the queues in order means every query has finished
+            for queue in (embed_queue, search_queue, fetch_queue, generate_queue):
+                await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            logging.error("RAG pipeline failed for a batched query: %s", error)
+        if errors and not return_exceptions:
+            raise errors[0]
+        return results
+
+    def run_pipeline_sync(
+        self,
+        query: str,
+        kb_type: KBType,
+        context_id: str | None = None,
+        query_vector: np.ndarray | None = None,
+    ) -> dict:
+        """
+        Blocking wrapper around run_pipeline for callers without an event loop
+        (scripts, worker threads).
+        """
+        return asyncio.run(self.run_pipeline(query, kb_type, context_id, query_vector))
+
+# Shared instance, created on first use. It is long-lived so the image cache
+# carries over between requests.
+_rag_pipeline_service: RAGPipelineService | None = None
+_rag_pipeline_service_lock = threading.Lock()
+
+def get_rag_pipeline_service() -> RAGPipelineService:
+    """
+    Returns the shared RAGPipelineService, wired to the shared services.
+    """
+    global _rag_pipeline_service
+    if _rag_pipeline_service is None:
+        with _rag_pipeline_service_lock:
+            if _rag_pipeline_service is None:
+                _rag_pipeline_service = RAGPipelineService(
+                    embedding_service=get_embedding_service(),
+                    vector_db_service=get_vector_db_service(),
+                    storage_service=get_storage_service(),
+                    generative_service=get_generative_service(),
+                )
+    return _rag_pipeline_service
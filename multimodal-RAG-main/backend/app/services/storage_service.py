@@ -1,12 +1,40 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError, ClientError
+from cachetools import TTLCache
 from backend.app.core.config import settings, Settings
+from concurrent.futures import Future, ThreadPoolExecutor
 import io
 import logging
+import threading
+
+# Large objects are sent as parallel multipart uploads; small ones in a single PUT
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True,
+)
+
+# One client serves concurrent downloads for several requests plus the parts of
+# multipart transfers, so size its connection pool well above botocore's default
+# of 10; keepalive avoids re-handshaking TLS between bursts of requests. Throttling
+# and 5xx responses are retried with backoff (up to 5 attempts) before a download
+# is reported as failed, and adaptive mode rate-limits the client while S3 throttles.
+_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    tcp_keepalive=True,
+)
 
 class StorageService:
     """
     A simple wrapper for cloud storage (AWS S3) to upload and download files.
+    Downloaded objects are kept in an LRU cache bounded by total size, so content
+    that keeps showing up in search results is fetched from S3 only once. Entries
+    expire after STORAGE_CACHE_TTL_SECONDS: uploads only evict this process's
+    copy, so an object overwritten by another worker or the bulk ingest script
+    is re-fetched at most that long after the change.
     """
     def __init__(self, config: Settings):
         """
@@ -16,6 +44,17 @@ class StorageService:
         self.bucket_name = config.S3_BUCKET_NAME
         self.s3_client = None
         self.is_enabled = False
+        self._upload_executor: ThreadPoolExecutor | None = None
+
+        # Keyed by (bucket, object name); objects over 1/8 of the budget are not
+        # cached so a single large file can't flush everything else
+        self._cache: TTLCache = TTLCache(
+            maxsize=config.STORAGE_CACHE_MAX_BYTES, ttl=config.STORAGE_CACHE_TTL_SECONDS, getsizeof=len
+        )
+        self._cache_max_item_bytes = config.STORAGE_CACHE_MAX_BYTES // 8
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         if all([config.AWS_ACCESS_KEY_ID, config.AWS_SECRET_ACCESS_KEY, config.AWS_REGION, config.S3_BUCKET_NAME]):
             logging.info("StorageService: AWS credentials found. Initializing S3 client.")
@@ -24,9 +63,11 @@ class StorageService:
                     's3',
                     aws_access_key_id=config.AWS_ACCESS_KEY_ID,
                     aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-                    region_name=config.AWS_REGION
+                    region_name=config.AWS_REGION,
+                    config=_CLIENT_CONFIG,
                 )
                 self.is_enabled = True
+                self._upload_executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix="s3-upload")
                 logging.info("StorageService: S3 client initialized successfully.")
             except NoCredentialsError:
                 logging.error("StorageService: AWS credentials not available.")
@@ -35,51 +76,181 @@ class StorageService:
         else:
             logging.warning("StorageService: AWS credentials or bucket name not fully configured. Service will be disabled.")
 
-    def upload_file(self, file_obj: io.BytesIO, object_name: str) -> bool:
+    def object_exists(self, object_name: str) -> bool:
+        """
+        Checks whether an object exists in the S3 bucket with a HEAD request.
+
+        Args:
+            object_name: S3 object name (path/filename).
+        Returns:
+            True if the object exists, False if it doesn't or the check failed.
+        """
+        if not self.is_enabled:
+            return False
+
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=object_name)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                logging.warning("Could not check whether %s exists: %s", object_name, e)
+            return False
+
+    def upload_file(self, file_obj: io.BytesIO, object_name: str, skip_if_exists: bool = False) -> bool:
         """
         Upload a file-like object to an S3 bucket.
 
         Args:
             file_obj: File-like object.
             object_name: S3 object name (path/filename).
+            skip_if_exists: Skip the upload when the object is already present. Only
+                            safe for content-addressed names (e.g. derived from a hash).
         Returns:
-            True if file was uploaded, else False.
+            True if file was uploaded (or already present), else False.
         """
         if not self.is_enabled:
             logging.error("Cannot upload file: StorageService is not enabled.")
             return False
+
+        if skip_if_exists and self.object_exists(object_name):
+            logging.info("Skipping upload of %s: already in bucket %s.", object_name, self.bucket_name)
+            return True
         
         try:
             file_obj.seek(0) # Ensure we're at the start of the file stream
-            self.s3_client.upload_fileobj(file_obj, self.bucket_name, object_name)
+            self.s3_client.upload_fileobj(file_obj, self.bucket_name, object_name, Config=_TRANSFER_CONFIG)
+            # The object may have been overwritten; drop any stale cached copy
+            with self._cache_lock:
+                self._cache.pop((self.bucket_name, object_name), None)
             logging.info("Successfully uploaded %s to bucket %s.", object_name, self.bucket_name)
         except ClientError as e:
             logging.error("Failed to upload %s: %s", object_name, e)
             return False
         return True
 
-    def download_file_as_stream(self, object_name: str) -> io.BytesIO | None:
+    def upload_file_async(self, file_obj: io.BytesIO, object_name: str, skip_if_exists: bool = False) -> Future:
         """
-        Downloads a file from an S3 bucket into a memory stream.
+        Starts uploading a file-like object in the background so callers can overlap
+        the network transfer with other work (e.g. embedding).
 
         Args:
+            file_obj: File-like object. It must stay open until the upload finishes.
             object_name: S3 object name (path/filename).
+            skip_if_exists: See upload_file.
         Returns:
-            An io.BytesIO stream of the file content, or None if download fails.
+            A Future resolving to the result of upload_file.
+        """
+        if not self.is_enabled:
+            future: Future = Future()
+            future.set_result(self.upload_file(file_obj, object_name, skip_if_exists))
+            return future
+        return self._upload_executor.submit(self.upload_file, file_obj, object_name, skip_if_exists)
+
+    def download_streamingbody(self, object_name: str):
+        """
+        Opens an S3 object for streaming with a single GET request.
+
+        Unlike download_fileobj, this skips the HEAD request the transfer manager
+        issues to size the object, saving a round-trip for the small objects that
+        make up RAG context.
+
+        Args:
+            object_name: S3 object name (path/filename).
+        Returns:
+            A botocore StreamingBody, which the caller must read and close, or None if
+            the request fails.
         """
         if not self.is_enabled:
             logging.error("Cannot download file: StorageService is not enabled.")
             return None
 
         try:
-            file_stream = io.BytesIO()
-            self.s3_client.download_fileobj(self.bucket_name, object_name, file_stream)
-            file_stream.seek(0) # Rewind stream to the beginning
-            logging.info("Successfully downloaded %s from bucket %s.", object_name, self.bucket_name)
-            return file_stream
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=object_name)["Body"]
         except ClientError as e:
             logging.error("Failed to download %s: %s", object_name, e)
             return None
 
-# Create a single, reusable instance of the service
-storage_service = StorageService(settings)
\ No newline at end of file
+    def _cache_lookup(self, object_name: str) -> bytes | None:
+        with self._cache_lock:
+            data = self._cache.get((self.bucket_name, object_name))
+            if data is None:
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+            hits, misses = self.cache_hits, self.cache_misses
+        logging.info("StorageService cache: %s for %s (hits=%d, misses=%d)", "hit" if data is not None else "miss", object_name, hits, misses)
+        return data
+
+    def _cache_store(self, object_name: str, data: bytes) -> None:
+        if len(data) <= self._cache_max_item_bytes:
+            with self._cache_lock:
+                self._cache[(self.bucket_name, object_name)] = data
+
+    def download_bytes(self, object_name: str) -> bytes | None:
+        """
+        Downloads a file from an S3 bucket, serving repeat requests from the cache.
+
+        Args:
+            object_name: S3 object name (path/filename).
+        Returns:
+            The file content, or None if download fails. The same bytes object may be
+            returned to several callers; it is immutable, so this is safe.
+        """
+        if not self.is_enabled:
+            logging.error("Cannot download file: StorageService is not enabled.")
+            return None
+
+        data = self._cache_lookup(object_name)
+        if data is not None:
+            return data
+
+        body = self.download_streamingbody(object_name)
+        if body is None:
+            return None
+        try:
+            with body:
+                data = body.read()
+            logging.info("Successfully downloaded %s from bucket %s.", object_name, self.bucket_name)
+        except (ClientError, OSError) as e:
+            logging.error("Failed to download %s: %s", object_name, e)
+            return None
+
+        self._cache_store(object_name, data)
+        return data
+
+    def download_file_as_stream(self, object_name: str) -> io.BytesIO | None:
+        """
+        Downloads a file from an S3 bucket into a memory stream.
+
+        Args:
+            object_name: S3 object name (path/filename).
+        Returns:
+            An io.BytesIO stream of the file content, or None if download fails.
+        """
+        data = self.download_bytes(object_name)
+        # A fresh stream per call, so callers never share a read position
+        return None if data is None else io.BytesIO(data)
+
+    def cache_clear(self) -> None:
+        """
+        Empties the download cache and resets its hit/miss counters.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+
+# Shared instance, created on first use.
+_storage_service: StorageService | None = None
+_storage_service_lock = threading.Lock()
+
+def get_storage_service() -> StorageService:
+    """
+    Returns the shared StorageService, creating the S3 client on first use.
+    """
+    global _storage_service
+    if _storage_service is None:
+        with _storage_service_lock:
+            if _storage_service is None:
+                _storage_service = StorageService(settings)
+    return _storage_service
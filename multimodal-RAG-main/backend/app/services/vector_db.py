@@ -1,8 +1,24 @@
+import asyncio
 import logging
+import os
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows: persistent indexes are not locked
+    fcntl = None
 from backend.app.core.config import settings, Settings
+from backend.app.core.hashing import content_hash
+from backend.app.core.vectors import l2_normalize
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from tenacity import before_sleep_log, retry, retry_if_exception, stop_after_attempt, wait_exponential, wait_random
 from enum import Enum
 import uuid
-from typing import Dict, List, Any
+from typing import Dict, List, Any, NamedTuple, Tuple
+import numpy as np
+import threading
 
 
 # Try to import the real Pinecone client; if it's not available, provide
@@ -12,40 +28,369 @@ try:
 except ImportError:
     _pinecone = None
 
+# The gRPC client (the pinecone[grpc] extra) sends vectors as protobuf floats
+# instead of JSON, which is smaller on the wire and cheaper to encode
+try:
+    from pinecone.grpc import PineconeGRPC as _PineconeGRPC  # type: ignore
+except ImportError:
+    _PineconeGRPC = None
+
+
+# A list of row numbers as (array, count): rows[:count] is the live part. Appends
+# write past `count` and publish a new tuple, so readers holding an older tuple
+# never see the array change under them; removals build a new array.
+_RowList = Tuple[np.ndarray, int]
+
+_EMPTY_ROWS: _RowList = (np.empty(0, dtype=np.int64), 0)
+
+
+def _rows_appended(entry: _RowList | None, row: int) -> _RowList:
+    rows, count = entry or _EMPTY_ROWS
+    if count == len(rows):
+        grown = np.empty(max(16, 2 * len(rows)), dtype=np.int64)
+        grown[:count] = rows[:count]
+        rows = grown
+    rows[count] = row
+    return rows, count + 1
+
+
+def _rows_removed(entry: _RowList, row: int) -> _RowList:
+    rows, count = entry
+    live = rows[:count]
+    return np.delete(live, np.flatnonzero(live == row)), count - 1
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest scores, best first. argpartition selects them in
+    linear time, so only those k are sorted.
+    """
+    if k < len(scores):
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class IndexLockedError(RuntimeError):
+    """Raised when another process already writes to a persistent in-memory index."""
+
+
+class _IndexSnapshot(NamedTuple):
+    vecs: np.ndarray
+    n: int
+    live: _RowList
+    by_kb: Dict[Any, _RowList]
+    by_kb_ctx: Dict[Tuple[Any, Any], _RowList]
+
 
 class _InMemoryIndex:
-    def __init__(self, name: str):
+    """
+    Brute-force cosine similarity index used when Pinecone is unavailable.
+
+    Vectors are L2-normalized on insert and kept in one contiguous float16 matrix
+    (grown by doubling), with ids and metadata in parallel lists, so a query is a
+    single matrix-vector product followed by a partial sort. Normalized CLIP
+    embeddings lose no meaningful recall in half precision, which halves the
+    index's memory; scoring upcasts just the candidate rows to float32.
+    Row numbers are also indexed by kb_type and by (kb_type, context_id), the two
+    filters VectorDBService issues, so only the matching rows are scored.
+
+    Queries never take a lock: each upsert call publishes an immutable snapshot
+    with a single attribute assignment, and queries work on whichever snapshot they
+    read. Rows are append-only (re-upserting an id appends a new row and retires
+    the old one), so publishing only costs the new rows plus a shallow copy of the
+    two index dicts.
+
+    With `path` set the index survives restarts: the matrix lives in a memory-mapped
+    `<path>.vecs.f16` file and each row's id and metadata are appended to
+    `<path>.meta.jsonl`. Reopening maps the vectors without reading them (the OS
+    pages them in on demand, and shares the pages between processes) and replays
+    only the metadata. Vectors are synced to disk every `flush_every` rows. Only
+    one index may have a path open at a time: an exclusive lock on the metadata
+    log is held until close(), and opening a locked path raises IndexLockedError.
+    """
+    def __init__(self, name: str, dimension: int | None = None, path: str | None = None, flush_every: int = 256):
         self.name = name
-        self._store: Dict[str, Dict[str, Any]] = {}
+        self._dimension = dimension
+        self._ids: List[str] = []
+        self._meta: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._snapshot = _IndexSnapshot(
+            vecs=np.empty((0, dimension or 0), dtype=np.float16), n=0, live=_EMPTY_ROWS, by_kb={}, by_kb_ctx={}
+        )
+
+        self._vecs_path = self._meta_file = None
+        self._flush_every = flush_every
+        self._unflushed = 0
+        if path is not None:
+            if dimension is None:
+                raise ValueError("A persistent index needs its dimension up front")
+            self._vecs_path = path + ".vecs.f16"
+            self._open(path + ".meta.jsonl")
+
+    def _open(self, meta_path: str) -> None:
+        """
+        Maps the vector file and rebuilds ids, metadata and filter indices from the
+        metadata log. A torn last line (from a crash mid-write) is cut off.
+        """
+        # Lock before reading anything, so a concurrent writer can't change the
+        # files under us; the lock lasts as long as the file stays open
+        # Unbuffered, so a failed write can be undone by truncating (a buffered
+        # writer would retry the rejected bytes on its next flush)
+        meta_file = open(meta_path, "ab", buffering=0)
+        if fcntl is not None:
+            try:
+                fcntl.flock(meta_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                meta_file.close()
+                raise IndexLockedError(
+                    f"{meta_path} is in use by another process; INMEMORY_INDEX_PATH can't be shared between writers"
+                ) from None
+
+        vecs = self._snapshot.vecs
+        row_bytes = self._dimension * np.dtype(np.float16).itemsize
+        capacity = os.path.getsize(self._vecs_path) // row_bytes if os.path.exists(self._vecs_path) else 0
+        if capacity:
+            vecs = np.memmap(self._vecs_path, dtype=np.float16, mode="r+", shape=(capacity, self._dimension))
+
+        n, live, by_kb, by_kb_ctx = 0, _EMPTY_ROWS, {}, {}
+        valid_bytes = 0
+        with open(meta_path, "rb") as f:
+            for line in f:
+                # Vectors are written before their metadata line, so every
+                # complete line has its row
+                if n == capacity or not line.endswith(b"\n"):
+                    break
+                record = orjson.loads(line)
+                live = self._link_row(n, record["id"], record["metadata"], live, by_kb, by_kb_ctx)
+                valid_bytes += len(line)
+                n += 1
+        meta_file.truncate(valid_bytes)
+        self._meta_file = meta_file
+        self._snapshot = _IndexSnapshot(vecs=vecs, n=n, live=live, by_kb=by_kb, by_kb_ctx=by_kb_ctx)
+        if n:
+            logging.info("In-memory index '%s': loaded %d vectors from %s", self.name, n, self._vecs_path)
+
+    def close(self) -> None:
+        """
+        Syncs a persistent index to disk and releases its lock. The index stays
+        usable on an in-memory copy but no longer persists upserts.
+        """
+        with self._lock:
+            if self._meta_file is None:
+                return
+            snap = self._snapshot
+            if isinstance(snap.vecs, np.memmap):
+                snap.vecs.flush()
+                # Detach from the file, which the next lock holder will write to
+                self._snapshot = snap._replace(vecs=np.array(snap.vecs))
+            self._meta_file.close()
+            self._meta_file = None
+            self._vecs_path = None
+
+    def _grow(self, vecs: np.ndarray, n: int) -> np.ndarray:
+        capacity = max(64, 2 * n)
+        if self._vecs_path is None:
+            grown = np.empty((capacity, self._dimension), dtype=np.float16)
+            grown[:n] = vecs[:n]
+            return grown
+        # Extend the file and map it again; snapshots still holding the old,
+        # shorter mapping stay valid
+        with open(self._vecs_path, "ab") as f:
+            f.truncate(capacity * self._dimension * np.dtype(np.float16).itemsize)
+        return np.memmap(self._vecs_path, dtype=np.float16, mode="r+", shape=(capacity, self._dimension))
+
+    def _link_row(self, row: int, vid: str, meta: Dict[str, Any], live: _RowList, by_kb: dict, by_kb_ctx: dict) -> _RowList:
+        """
+        Makes `row` the current row of `vid`, retiring its previous row if any.
+        Updates `by_kb` and `by_kb_ctx` in place and returns the new live list.
+        """
+        old_row = self._row_of.get(vid)
+        if old_row is not None:
+            kb_type, context_id = self._filter_keys(self._meta[old_row])
+            live = _rows_removed(live, old_row)
+            by_kb[kb_type] = _rows_removed(by_kb[kb_type], old_row)
+            by_kb_ctx[kb_type, context_id] = _rows_removed(by_kb_ctx[kb_type, context_id], old_row)
+
+        kb_type, context_id = self._filter_keys(meta)
+        live = _rows_appended(live, row)
+        by_kb[kb_type] = _rows_appended(by_kb.get(kb_type), row)
+        by_kb_ctx[kb_type, context_id] = _rows_appended(by_kb_ctx.get((kb_type, context_id)), row)
+        self._ids.append(vid)
+        self._meta.append(meta)
+        self._row_of[vid] = row
+        return live
 
     def upsert(self, vectors: List[tuple]):
-        for vid, vec, meta in vectors:
-            self._store[vid] = {"vector": vec, "metadata": meta}
-
-    def query(self, vector: List[float], filter_query: Dict[str, Any], top_k: int = 5, include_metadata: bool = False):
-        # Very naive: return up to top_k stored items without real similarity scoring
-        # Reference arguments to avoid unused-argument warnings
-        _ = vector
-        _ = include_metadata
+        with self._lock:
+            snap = self._snapshot
+            vecs, n, live = snap.vecs, snap.n, snap.live
+            by_kb, by_kb_ctx = dict(snap.by_kb), dict(snap.by_kb_ctx)
+
+            # Check every vector before touching any state, so a bad one can't leave
+            # ids and rows out of step
+            rows = [(vid, np.asarray(vec, dtype=np.float32), meta) for vid, vec, meta in vectors]
+            for _, vec, _ in rows:
+                if self._dimension is None:
+                    self._dimension = vec.shape[0]
+                elif vec.shape[0] != self._dimension:
+                    raise ValueError(f"Vector dimension {vec.shape[0]} does not match index dimension {self._dimension}")
+
+            log = []
+            base = len(self._ids)
+            previous_rows: Dict[str, int | None] = {}
+            try:
+                for vid, vec, meta in rows:
+                    if n == vecs.shape[0]:
+                        vecs = self._grow(vecs, n)
+                    # Rows past the published `n` are invisible to readers, so this is safe
+                    # A zero vector is stored as a zero row, which scores 0 rather than nan
+                    vecs[n] = l2_normalize(vec)
+                    if self._meta_file is not None:
+                        log.append(orjson.dumps({"id": vid, "metadata": meta}) + b"\n")
+                    previous_rows.setdefault(vid, self._row_of.get(vid))
+                    live = self._link_row(n, vid, meta, live, by_kb, by_kb_ctx)
+                    n += 1
+
+                if self._meta_file is not None:
+                    self._persist(vecs, log)
+            except BaseException:
+                # Roll back the id bookkeeping. Vector rows and row lists past the
+                # published snapshot are invisible and get overwritten next time.
+                del self._ids[base:]
+                del self._meta[base:]
+                for vid, row in previous_rows.items():
+                    if row is None:
+                        del self._row_of[vid]
+                    else:
+                        self._row_of[vid] = row
+                raise
+            self._snapshot = _IndexSnapshot(vecs=vecs, n=n, live=live, by_kb=by_kb, by_kb_ctx=by_kb_ctx)
+
+    def _persist(self, vecs: np.ndarray, log: List[bytes]) -> None:
+        """
+        Appends the rows' metadata lines to the log. The lines define which rows
+        exist on reopen, so they go last, and a failed write is truncated away
+        before the error propagates.
+        """
+        # Everything written to the mapping survives a process crash; msync is batched
+        self._unflushed += len(log)
+        if self._unflushed >= self._flush_every:
+            vecs.flush()
+            self._unflushed = 0
+
+        start = os.fstat(self._meta_file.fileno()).st_size
+        data = memoryview(b"".join(log))
+        try:
+            while data:
+                data = data[self._meta_file.write(data):]
+        except BaseException:
+            self._meta_file.truncate(start)
+            raise
+
+    @staticmethod
+    def _filter_keys(meta: Dict[str, Any]) -> Tuple[Any, Any]:
+        return meta.get("kb_type"), meta.get("context_id")
+
+    def _candidate_rows(self, snap: _IndexSnapshot, filter: Dict[str, Any] | None) -> np.ndarray:
+        """
+        Returns the rows matching an equality filter, from the precomputed indices
+        when the filter has one of the two shapes VectorDBService builds.
+        """
+        if not filter:
+            entry = snap.live
+        elif filter.keys() == {"kb_type"}:
+            entry = snap.by_kb.get(filter["kb_type"], _EMPTY_ROWS)
+        elif filter.keys() == {"kb_type", "context_id"}:
+            entry = snap.by_kb_ctx.get((filter["kb_type"], filter["context_id"]), _EMPTY_ROWS)
+        else:
+            rows, count = snap.live
+            return np.fromiter(
+                (i for i in rows[:count] if all(self._meta[i].get(k) == v for k, v in filter.items())),
+                dtype=np.int64,
+            )
+        rows, count = entry
+        return rows[:count]
+
+    def query(
+        self,
+        vector: np.ndarray | List[float],
+        filter: Dict[str, Any] | None = None,
+        top_k: int = 5,
+        include_metadata: bool = False,
+        include_values: bool = False,
+    ):
+        snap = self._snapshot
+        candidates = self._candidate_rows(snap, filter)
+        # Fancy indexing gathers just the candidates into a contiguous block; NumPy has
+        # no fast half-precision matmul, so upcast that (small) block
+        vecs = snap.vecs[candidates].astype(np.float32)
+
+        if not len(candidates) or top_k <= 0:
+            return {"matches": []}
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = vecs @ l2_normalize(query)
+        top = _top_k(scores, top_k)
+        return {"matches": self._matches(candidates, vecs, top, scores[top], include_metadata, include_values)}
+
+    def query_batch(
+        self,
+        vectors: np.ndarray,
+        filter: Dict[str, Any] | None = None,
+        top_k: int = 5,
+        include_metadata: bool = False,
+        include_values: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs several queries that share a filter with one matrix-matrix product,
+        gathering the candidate rows once. Returns one query() result per row of
+        `vectors`.
+        """
+        snap = self._snapshot
+        candidates = self._candidate_rows(snap, filter)
+        if not len(candidates) or top_k <= 0:
+            return [{"matches": []} for _ in range(len(vectors))]
+        vecs = snap.vecs[candidates].astype(np.float32)
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        queries = l2_normalize(queries, axis=1)
+        all_scores = vecs @ queries.T
+        results = []
+        for scores in all_scores.T:
+            top = _top_k(scores, top_k)
+            results.append({"matches": self._matches(candidates, vecs, top, scores[top], include_metadata, include_values)})
+        return results
+
+    def _matches(self, candidates, vecs, top, scores, include_metadata: bool, include_values: bool) -> List[Dict[str, Any]]:
         matches = []
-        for vid, item in list(self._store.items())[:top_k]:
-            # If a simple filter_query is provided, perform a minimal metadata match check
-            if filter_query:
-                meta = item.get("metadata", {})
-                ok = True
-                for k, v in filter_query.items():
-                    if meta.get(k) != v:
-                        ok = False
-                        break
-                if not ok:
-                    continue
+        for i, score in zip(top, scores):
+            match = {"id": self._ids[candidates[i]], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = self._meta[candidates[i]]
+            if include_values:
+                match["values"] = vecs[i].tolist()
+            matches.append(match)
+        return matches
 
-            matches.append({"id": vid, "score": 1.0, "metadata": item.get("metadata", {})})
-        return {"matches": matches}
+    def fetch(self, ids: List[str]):
+        with self._lock:
+            vecs = self._snapshot.vecs
+            rows = {vid: self._row_of[vid] for vid in ids if vid in self._row_of}
+        return {
+            "vectors": {
+                vid: {"id": vid, "values": vecs[row].astype(np.float32).tolist(), "metadata": self._meta[row]}
+                for vid, row in rows.items()
+            }
+        }
 
 
 class _InMemoryPineconeAdapter:
-    def __init__(self):
+    def __init__(self, path: str | None = None):
+        # Directory for persistent indexes; None keeps them in memory only
+        self._path = path
         self._indexes = set()
         self._index_objs: Dict[str, _InMemoryIndex] = {}
 
@@ -59,15 +404,20 @@ class _InMemoryPineconeAdapter:
         return list(self._indexes)
 
     def create_index(self, name: str, dimension: int, metric: str, metadata_config: Dict[str, Any]) -> None:
-        # Keep signature compatible with real pinecone but only use the name
-        _ = dimension
+        # Keep signature compatible with real pinecone but only use the name and dimension
         _ = metric
         _ = metadata_config
         self._indexes.add(name)
-        self._index_objs[name] = _InMemoryIndex(name)
+        path = None
+        if self._path is not None:
+            os.makedirs(self._path, exist_ok=True)
+            path = os.path.join(self._path, name)
+        self._index_objs[name] = _InMemoryIndex(name, dimension, path=path)
 
     def Index(self, name: str) -> _InMemoryIndex:
-        return self._index_objs.setdefault(name, _InMemoryIndex(name))
+        if name not in self._index_objs:
+            self._index_objs[name] = _InMemoryIndex(name)
+        return self._index_objs[name]
 
 
 if _pinecone is None:
@@ -78,6 +428,208 @@ class KBType(str, Enum):
     GKB = "gkb"  # General Knowledge Base
     SKB = "skb"  # Specific Knowledge Base
 
+# Worker threads (and pooled HTTPS connections) the Pinecone client uses, so that
+# concurrent queries from request handlers don't serialize on one connection
+PINECONE_POOL_THREADS = 32
+
+# HTTP statuses worth retrying: throttling and server-side failures
+_TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+# The gRPC equivalents, by grpc.StatusCode name
+_TRANSIENT_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED"}
+
+
+def _grpc_code_name(error: BaseException) -> str | None:
+    # grpc.RpcError exposes its status through a code() method
+    code = getattr(error, "code", None)
+    if not callable(code):
+        return None
+    try:
+        return getattr(code(), "name", None)
+    except Exception:
+        return None
+
+
+def _is_transient(error: BaseException | None) -> bool:
+    """
+    Whether a failed Pinecone call is worth retrying. The HTTP client surfaces
+    connection failures and timeouts as urllib3 errors (MaxRetryError,
+    NewConnectionError, ReadTimeoutError, ProtocolError all derive from
+    urllib3's HTTPError) and API errors with a `.status`; the gRPC client wraps
+    a grpc.RpcError in a PineconeException, so the exception chain is checked too.
+    """
+    while error is not None:
+        if (
+            isinstance(error, (ConnectionError, TimeoutError, Urllib3HTTPError))
+            or getattr(error, "status", None) in _TRANSIENT_STATUSES
+            or _grpc_code_name(error) in _TRANSIENT_GRPC_CODES
+        ):
+            return True
+        error = error.__cause__
+    return False
+
+
+# Retries a Pinecone call up to 3 times in total with jittered exponential backoff,
+# so a single blip doesn't throw away the embedding work already done for a query.
+# Only for idempotent calls; the original exception is raised if all attempts fail.
+_pinecone_retry = retry(
+    retry=retry_if_exception(_is_transient),
+    wait=wait_exponential(multiplier=0.1, max=2) + wait_random(0, 0.2),
+    stop=stop_after_attempt(3),
+    before_sleep=before_sleep_log(logging.getLogger(), logging.WARNING),
+    reraise=True,
+)
+
+
+def _index_cache_key(pinecone_client, index_name: str, dimension: int, config: Settings):
+    # The client object is rebuilt for every service; the account it talks to is
+    # identified by the API key, which is only kept as a digest
+    return hashkey(content_hash((config.PINECONE_API_KEY or "").encode()), index_name)
+
+
+@cached(TTLCache(maxsize=16, ttl=3600), key=_index_cache_key, lock=threading.Lock())
+def _ensure_index(pinecone_client, index_name: str, dimension: int, config: Settings) -> bool:
+    """
+    Makes sure `index_name` exists, creating it if needed. A successful check is
+    remembered for an hour per (API key, index name), so services built after the
+    first one go straight to the index instead of calling list_indexes again.
+    Raises if the index could not be created; failures are not cached.
+    Call `_ensure_index.cache_clear()` to force a fresh check.
+    """
+    existing = ()
+    try:
+        result = pinecone_client.list_indexes()  # type: ignore[attr-defined]
+        # Some clients return an object with .names(), others return a list
+        if hasattr(result, "names"):
+            existing = tuple(result.names())  # type: ignore[attr-defined]
+        elif isinstance(result, list):
+            existing = tuple(result)
+    except Exception as e:
+        logging.warning(f"VectorDBService: Could not list indexes: {e}. Skipping index creation check.")
+
+    if index_name in existing:
+        return True
+
+    logging.info("VectorDBService: Index '%s' not found. Attempting to create...", index_name)
+    # Try the simpler create_index signature first
+    try:
+        pinecone_client.create_index(  # type: ignore[attr-defined]
+            name=index_name,
+            dimension=dimension,
+            metric="cosine",
+            metadata_config={"indexed": ["kb_type", "context_id"]}
+        )
+        logging.info("VectorDBService: Index created successfully with metadata_config.")
+        return True
+    except TypeError:
+        pass
+
+    # New Pinecone API requires spec; try ServerlessSpec if available
+    ServerlessSpec = getattr(_pinecone, "ServerlessSpec", None) or getattr(pinecone_client, "ServerlessSpec", None)
+    if ServerlessSpec is None:
+        raise RuntimeError("ServerlessSpec not available; cannot create index")
+
+    # Extract a valid AWS region from PINECONE_ENVIRONMENT or AWS_REGION
+    # Valid AWS regions: us-east-1, us-west-2, eu-west-1, etc.
+    # If PINECONE_ENVIRONMENT contains "gcp", try gcp-starter or default to us-west-2
+    env_region = config.PINECONE_ENVIRONMENT or ""
+    aws_region = config.AWS_REGION or ""
+
+    # Pick a valid region
+    if "gcp" in env_region.lower():
+        region = "gcp-starter"
+    elif aws_region and not "gcp" in aws_region.lower():
+        region = aws_region
+    else:
+        region = "us-west-2"
+
+    cloud = "gcp" if region == "gcp-starter" else "aws"
+
+    logging.info(f"VectorDBService: Creating index with ServerlessSpec cloud={cloud}, region={region}")
+    spec = ServerlessSpec(cloud=cloud, region=region)
+    pinecone_client.create_index(  # type: ignore[attr-defined]
+        name=index_name,
+        dimension=dimension,
+        metric="cosine",
+        spec=spec
+    )
+    logging.info("VectorDBService: Index created successfully with ServerlessSpec.")
+    return True
+
+
+class _QueryBatcher:
+    """
+    Dynamic batching for queries issued concurrently on one event loop.
+
+    Queries are queued with a key (everything but the vector); the worker takes
+    the first one, and if others are already waiting keeps collecting for up to
+    `max_wait` seconds or `max_batch` queries. Each group of queries sharing a key
+    is then answered by a single `run_batch(key, vectors)` call in a worker thread.
+    A query that arrives alone is dispatched immediately, so an idle server
+    doesn't pay the batching window.
+
+    The worker exits (calling `on_idle(batcher)`) as soon as the queue drains, or
+    when it is cancelled at loop shutdown, so nothing keeps a finished loop alive.
+    """
+    def __init__(self, run_batch, on_idle, max_batch: int = 16, max_wait: float = 0.025):
+        self._run_batch = run_batch
+        self._on_idle = on_idle
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+        # The event loop only keeps weak references to tasks
+        self._dispatches: set = set()
+
+    async def submit(self, key: tuple, vector: np.ndarray):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((key, vector, future))
+        return await future
+
+    async def _collect(self):
+        try:
+            await self._collect_until_idle()
+        finally:
+            self._on_idle(self)
+
+    async def _collect_until_idle(self):
+        loop = asyncio.get_running_loop()
+        while not self._queue.empty():
+            items = [self._queue.get_nowait()]
+            # Let queries submitted in the same loop iteration enqueue themselves
+            await asyncio.sleep(0)
+            if not self._queue.empty():
+                deadline = loop.time() + self._max_wait
+                while len(items) < self._max_batch:
+                    try:
+                        items.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+
+            groups: Dict[tuple, list] = {}
+            for key, vector, future in items:
+                groups.setdefault(key, []).append((vector, future))
+            for key, group in groups.items():
+                # Don't block collecting the next batch on this one
+                task = asyncio.create_task(self._dispatch(key, group))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, key: tuple, group: list):
+        try:
+            results = await asyncio.to_thread(self._run_batch, key, [vector for vector, _ in group])
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
 class VectorDBService:
     """
     A service to manage all communications with the Pinecone vector database.
@@ -98,10 +650,16 @@ class VectorDBService:
             # New pinecone releases require creating a Pinecone() instance
             if hasattr(_pinecone, "Pinecone") and config.PINECONE_API_KEY:
                 # Create a Pinecone client instance
+                # Prefer the gRPC transport when its extra is installed
+                client_cls = _PineconeGRPC or _pinecone.Pinecone
                 try:
-                    pc = _pinecone.Pinecone(api_key=config.PINECONE_API_KEY)
+                    try:
+                        pc = client_cls(api_key=config.PINECONE_API_KEY, pool_threads=PINECONE_POOL_THREADS)
+                    except TypeError:
+                        # Client releases without connection pool settings
+                        pc = client_cls(api_key=config.PINECONE_API_KEY)
                     pinecone_client = pc
-                    logging.info("VectorDBService: Connected to real Pinecone client.")
+                    logging.info("VectorDBService: Connected to real Pinecone client (%s).", "gRPC" if client_cls is _PineconeGRPC else "HTTP")
                 except Exception as init_err:
                     logging.warning(f"VectorDBService: Failed to initialize Pinecone client: {init_err}. Using in-memory fallback.")
                     pinecone_client = None
@@ -121,80 +679,37 @@ class VectorDBService:
             logging.warning(f"VectorDBService: Unexpected error during Pinecone init: {e}. Using in-memory fallback.")
             pinecone_client = None
         
-        # If real Pinecone client failed to initialize, use in-memory adapter
-        if pinecone_client is None:
-            pinecone_client = _InMemoryPineconeAdapter()
+        # If real Pinecone client failed to initialize, use in-memory adapter (also
+        # when the module-level stand-in was picked up, so persistence applies)
+        if pinecone_client is None or isinstance(pinecone_client, _InMemoryPineconeAdapter):
+            pinecone_client = _InMemoryPineconeAdapter(config.INMEMORY_INDEX_PATH)
             logging.info("VectorDBService: Using in-memory Pinecone adapter.")
 
         self.index_name = config.PINECONE_INDEX_NAME
         self.dimension = 512  # Dimension for CLIP model openai/clip-vit-base-patch32
 
         # Ensure index exists and create/connect using the resolved client
-        existing = []
         try:
-            result = pinecone_client.list_indexes()  # type: ignore[attr-defined]
-            # Some clients return an object with .names(), others return a list
-            if hasattr(result, "names"):
-                existing = result.names()  # type: ignore[attr-defined]
+            if isinstance(pinecone_client, _InMemoryPineconeAdapter):
+                # Local and fresh for every service: there is nothing to cache
+                _ensure_index.__wrapped__(pinecone_client, self.index_name, self.dimension, config)
             else:
-                existing = result if isinstance(result, list) else []
+                _ensure_index(pinecone_client, self.index_name, self.dimension, config)
+        except IndexLockedError:
+            # Falling back to an empty index would silently lose the persisted data
+            raise
         except Exception as e:
-            logging.warning(f"VectorDBService: Could not list indexes: {e}. Skipping index creation check.")
-            existing = []
-
-        if self.index_name not in existing:
-            logging.info("VectorDBService: Index '%s' not found. Attempting to create...", self.index_name)
-            try:
-                # Try the simpler create_index signature first
-                try:
-                    pinecone_client.create_index(  # type: ignore[attr-defined]
-                        name=self.index_name,
-                        dimension=self.dimension,
-                        metric="cosine",
-                        metadata_config={"indexed": ["kb_type", "context_id"]}
-                    )
-                    logging.info("VectorDBService: Index created successfully with metadata_config.")
-                except TypeError:
-                    # New Pinecone API requires spec; try ServerlessSpec if available
-                    ServerlessSpec = getattr(_pinecone, "ServerlessSpec", None) or getattr(pinecone_client, "ServerlessSpec", None)
-                    if ServerlessSpec is not None:
-                        # Extract a valid AWS region from PINECONE_ENVIRONMENT or AWS_REGION
-                        # Valid AWS regions: us-east-1, us-west-2, eu-west-1, etc.
-                        # If PINECONE_ENVIRONMENT contains "gcp", try gcp-starter or default to us-west-2
-                        env_region = config.PINECONE_ENVIRONMENT or ""
-                        aws_region = config.AWS_REGION or ""
-                        
-                        # Pick a valid region
-                        if "gcp" in env_region.lower():
-                            region = "gcp-starter"
-                        elif aws_region and not "gcp" in aws_region.lower():
-                            region = aws_region
-                        else:
-                            region = "us-west-2"
-                        
-                        cloud = "gcp" if region == "gcp-starter" else "aws"
-                        
-                        logging.info(f"VectorDBService: Creating index with ServerlessSpec cloud={cloud}, region={region}")
-                        try:
-                            spec = ServerlessSpec(cloud=cloud, region=region)
-                            pinecone_client.create_index(  # type: ignore[attr-defined]
-                                name=self.index_name,
-                                dimension=self.dimension,
-                                metric="cosine",
-                                spec=spec
-                            )
-                            logging.info("VectorDBService: Index created successfully with ServerlessSpec.")
-                        except Exception as spec_err:
-                            logging.warning(f"VectorDBService: Failed to create index with ServerlessSpec: {spec_err}. Index may already exist.")
-                    else:
-                        logging.warning("VectorDBService: ServerlessSpec not available; cannot create index.")
-            except Exception as e:
-                logging.warning(f"VectorDBService: Could not create index '{self.index_name}': {e}. Continuing with existing index or in-memory fallback.")
+            logging.warning(f"VectorDBService: Could not create index '{self.index_name}': {e}. Continuing with existing index or in-memory fallback.")
 
         try:
             # Obtain an index object with upsert/query methods
-            if hasattr(pinecone_client, "Index"):
-                self.index = pinecone_client.Index(self.index_name)  # type: ignore[attr-defined]
+            if isinstance(pinecone_client, _InMemoryPineconeAdapter):
+                self.index = pinecone_client.Index(self.index_name)
+            elif hasattr(pinecone_client, "Index"):
+                try:
+                    self.index = pinecone_client.Index(self.index_name, pool_threads=PINECONE_POOL_THREADS)  # type: ignore[attr-defined]
+                except TypeError:
+                    self.index = pinecone_client.Index(self.index_name)  # type: ignore[attr-defined]
             elif hasattr(pinecone_client, "index"):
                 self.index = pinecone_client.index(self.index_name)  # type: ignore[attr-defined]
             else:
@@ -209,11 +724,24 @@ class VectorDBService:
                 # Last resort: create a minimal in-memory index
                 self.index = _InMemoryIndex(self.index_name)
 
+        # Batchers hold asyncio primitives, so there is one per event loop while it
+        # has queries in flight; idle batchers remove themselves
+        self._batchers: Dict[asyncio.AbstractEventLoop, _QueryBatcher] = {}
         logging.info("VectorDBService: Pinecone initialized and connected to index.")
 
+    def _prepare_vector(self, vector: np.ndarray | list[float]) -> np.ndarray | list[float]:
+        """
+        The in-memory index works on arrays directly; Pinecone's clients (JSON over
+        HTTP, or protobuf over gRPC) expect a plain list of floats, built here in a
+        single C-level pass.
+        """
+        if isinstance(self.index, _InMemoryIndex):
+            return vector
+        return np.asarray(vector, dtype=np.float32).tolist()
+
     def upsert(
         self,
-        vector: list[float],
+        vector: np.ndarray | list[float],
         kb_type: KBType,
         source_type: str,
         source_id: str,
@@ -244,25 +772,138 @@ class VectorDBService:
             "context_id": context_id or "gkb_default"
         }
         
-        self.index.upsert(vectors=[(vector_id, vector, metadata)])
+        self._upsert_with_retry([(vector_id, self._prepare_vector(vector), metadata)])
         return vector_id
 
+    # The vector id is generated once before the first attempt, so a retried upsert
+    # overwrites the same record rather than adding a duplicate
+    @_pinecone_retry
+    def _upsert_with_retry(self, vectors: list[tuple]):
+        return self.index.upsert(vectors=vectors)
+
+    @_pinecone_retry
+    def _query_with_retry(self, **kwargs):
+        return self.index.query(**kwargs)
+
+    @_pinecone_retry
+    def _fetch_with_retry(self, ids: list[str]):
+        return self.index.fetch(ids=ids)
+
     def query(
         self,
-        vector: list[float],
+        vector: np.ndarray | list[float],
         kb_type: KBType,
         context_id: str | None = None,
-        top_k: int = 5
+        top_k: int = 5,
+        include_metadata: bool = True,
     ) -> list[dict]:
         """
         Queries the index using metadata filters for GKB/SKB logic.
+        Pass include_metadata=False when only ids and scores are needed; the
+        metadata payload dominates the response size.
+        """
+        results = self._query_with_retry(
+            vector=self._prepare_vector(vector),
+            filter=self._filter_for(kb_type, context_id),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=False,
+        )
+        return results.get('matches', [])
+
+    def query_ids_only(
+        self,
+        vector: np.ndarray | list[float],
+        kb_type: KBType,
+        context_id: str | None = None,
+        top_k: int = 20
+    ) -> list[dict]:
+        """
+        Cheap first stage for reranking: returns just the ids and scores of the
+        top_k matches. Use hydrate() to load metadata for the final selection.
+        """
+        return self.query(vector, kb_type, context_id, top_k=top_k, include_metadata=False)
+
+    def hydrate(self, ids: list[str]) -> list[dict]:
+        """
+        Fetches the metadata for the given vector ids in a single request.
+        Returns {"id", "metadata"} dicts in the order of `ids`, skipping ids that
+        no longer exist.
         """
+        if not ids:
+            return []
+        response = self._fetch_with_retry(ids)
+        # Newer clients return an object with a .vectors attribute, older ones a dict
+        vectors = getattr(response, "vectors", None)
+        if vectors is None:
+            vectors = response.get("vectors", {})
+
+        hydrated = []
+        for vid in ids:
+            vec = vectors.get(vid)
+            if vec is None:
+                continue
+            metadata = vec.get("metadata") if isinstance(vec, dict) else getattr(vec, "metadata", None)
+            hydrated.append({"id": vid, "metadata": metadata or {}})
+        return hydrated
+
+    @staticmethod
+    def _filter_for(kb_type: KBType, context_id: str | None) -> Dict[str, str]:
         filter_query = {"kb_type": kb_type.value}
         if kb_type == KBType.SKB and context_id:
             filter_query["context_id"] = context_id
-        
-        results = self.index.query(vector=vector, filter=filter_query, top_k=top_k, include_metadata=True)
-        return results.get('matches', [])
+        return filter_query
+
+    def _query_batch(self, key: tuple, vectors: list) -> list[list[dict]]:
+        kb_type, context_id, top_k = key
+        results = self.index.query_batch(
+            np.stack(vectors), filter=self._filter_for(kb_type, context_id), top_k=top_k, include_metadata=True
+        )
+        return [result.get('matches', []) for result in results]
 
-# Create a single, reusable instance of the service
-vector_db_service = VectorDBService(settings)
\ No newline at end of file
+    def _batcher(self) -> _QueryBatcher:
+        loop = asyncio.get_running_loop()
+        batcher = self._batchers.get(loop)
+        if batcher is None:
+            batcher = self._batchers[loop] = _QueryBatcher(self._query_batch, on_idle=self._drop_batcher)
+        return batcher
+
+    def _drop_batcher(self, batcher: _QueryBatcher) -> None:
+        loop = asyncio.get_running_loop()
+        if self._batchers.get(loop) is batcher:
+            del self._batchers[loop]
+
+    async def aquery(
+        self,
+        vector: np.ndarray | list[float],
+        kb_type: KBType,
+        context_id: str | None = None,
+        top_k: int = 5
+    ) -> list[dict]:
+        """
+        Awaitable variant of query.
+
+        With the in-memory index, concurrent queries are batched into one
+        matrix-matrix product (see _QueryBatcher). Pinecone queries run one per
+        worker thread instead, so several single-vector queries are in flight at
+        once, which Pinecone recommends over batching them.
+        """
+        if isinstance(self.index, _InMemoryIndex):
+            return await self._batcher().submit((kb_type, context_id, top_k), np.asarray(vector, dtype=np.float32))
+        return await asyncio.to_thread(self.query, vector, kb_type, context_id, top_k)
+
+# The shared instance is created on first use; connecting probes the Pinecone
+# control plane, which shouldn't happen as a side effect of importing KBType.
+_vector_db_service: VectorDBService | None = None
+_vector_db_service_lock = threading.Lock()
+
+def get_vector_db_service() -> VectorDBService:
+    """
+    Returns the shared VectorDBService, connecting to the index on first use.
+    """
+    global _vector_db_service
+    if _vector_db_service is None:
+        with _vector_db_service_lock:
+            if _vector_db_service is None:
+                _vector_db_service = VectorDBService(settings)
+    return _vector_db_service
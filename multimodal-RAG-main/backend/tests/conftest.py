@@ -0,0 +1,6 @@
+import os
+
+# Settings are read at import time; these keep the services on their offline
+# fallbacks (in-memory vector index, no Gemini, no S3) for the tests.
+os.environ.setdefault("PINECONE_API_KEY", "")
+os.environ.setdefault("GOOGLE_API_KEY", "YOUR_GOOGLE_API_KEY")
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from backend.app.services.embedding import _normalize_rows, _normalize_rows_numpy
+
+
+@pytest.mark.parametrize("normalize", [_normalize_rows, _normalize_rows_numpy])
+def test_rows_have_unit_norm(normalize):
+    x = np.random.default_rng(0).standard_normal((4, 512)).astype(np.float32)
+    np.testing.assert_allclose(np.linalg.norm(normalize(x), axis=1), 1.0, rtol=1e-5)
+
+
+@pytest.mark.parametrize("normalize", [_normalize_rows, _normalize_rows_numpy])
+def test_zero_row_stays_zero(normalize):
+    x = np.zeros((3, 512), dtype=np.float32)
+    x[1] = 2.0
+    out = normalize(x)
+    assert np.all(np.isfinite(out))
+    assert not out[0].any() and not out[2].any()
+    np.testing.assert_allclose(np.linalg.norm(out[1]), 1.0, rtol=1e-5)
+
+
+def test_compiled_and_numpy_paths_agree():
+    x = np.random.default_rng(1).standard_normal((8, 512)).astype(np.float32)
+    x[3] = 0.0
+    np.testing.assert_allclose(_normalize_rows(x), _normalize_rows_numpy(x), rtol=1e-5, atol=1e-7)
@@ -0,0 +1,14 @@
+import numpy as np
+
+from backend.app.services.vector_db import _InMemoryIndex
+
+
+def test_zero_vectors_score_zero_instead_of_nan():
+    index = _InMemoryIndex("idx", 4)
+    index.upsert([("zero", np.zeros(4, dtype=np.float32), {}), ("x", np.array([1, 0, 0, 0], dtype=np.float32), {})])
+
+    matches = index.query(np.array([1, 0, 0, 0], dtype=np.float32), top_k=2)["matches"]
+    assert [(m["id"], m["score"]) for m in matches] == [("x", 1.0), ("zero", 0.0)]
+
+    for result in (index.query(np.zeros(4), top_k=2), *index.query_batch(np.zeros((1, 4)), top_k=2)):
+        assert all(np.isfinite(m["score"]) for m in result["matches"])
@@ -0,0 +1,107 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from backend.app.services.vector_db import IndexLockedError, _InMemoryIndex
+
+fcntl = pytest.importorskip("fcntl")
+
+
+def _meta(i: int) -> dict:
+    return {"kb_type": "gkb", "source_type": "text", "source_id": f"s3://bucket/{i}", "context_id": "gkb_default"}
+
+
+def _try_open(path: str, queue) -> None:
+    try:
+        _InMemoryIndex("idx", 8, path=path)
+        queue.put("opened")
+    except IndexLockedError:
+        queue.put("locked")
+
+
+def test_reopen_restores_vectors(tmp_path):
+    path = str(tmp_path / "idx")
+    vectors = np.random.default_rng(0).standard_normal((100, 8)).astype(np.float32)
+    index = _InMemoryIndex("idx", 8, path=path)
+    index.upsert([(f"id{i}", vectors[i], _meta(i)) for i in range(100)])
+    expected = index.query(vectors[7], top_k=3)
+    index.close()
+
+    reopened = _InMemoryIndex("idx", 8, path=path)
+    assert reopened.query(vectors[7], top_k=3) == expected
+
+
+def test_second_writer_is_rejected(tmp_path):
+    path = str(tmp_path / "idx")
+    index = _InMemoryIndex("idx", 8, path=path)
+    with pytest.raises(IndexLockedError):
+        _InMemoryIndex("idx", 8, path=path)
+
+    # Another process (e.g. a second uvicorn worker or the bulk ingest script)
+    queue = multiprocessing.get_context("spawn").Queue()
+    process = multiprocessing.get_context("spawn").Process(target=_try_open, args=(path, queue))
+    process.start()
+    process.join(60)
+    assert queue.get(timeout=5) == "locked"
+
+    index.close()
+    _InMemoryIndex("idx", 8, path=path).close()
+
+
+class _FailingWrites:
+    """Wraps the metadata log so writes store a few bytes, then fail like ENOSPC."""
+    def __init__(self, raw):
+        self._raw = raw
+
+    def write(self, data):
+        self._raw.write(bytes(data[:5]))
+        raise OSError(28, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def _unit(i: int, dim: int = 8) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def test_failed_persist_keeps_ids_and_rows_in_step(tmp_path, monkeypatch):
+    index = _InMemoryIndex("idx", 8, path=str(tmp_path / "idx"))
+    index.upsert([("a", _unit(0), _meta(0)), ("b", _unit(1), _meta(1))])
+
+    def fail(vecs, log):
+        raise OSError(28, "No space left on device")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(index, "_persist", fail)
+        with pytest.raises(OSError):
+            index.upsert([("c", _unit(2), _meta(2)), ("a", _unit(3), _meta(3))])
+
+    assert [m["id"] for m in index.query(_unit(0), top_k=1)["matches"]] == ["a"]
+    assert index.fetch(["c"])["vectors"] == {}
+    index.upsert([("c", _unit(2), _meta(2))])
+    assert [m["id"] for m in index.query(_unit(2), top_k=1)["matches"]] == ["c"]
+    assert [m["id"] for m in index.query(_unit(1), top_k=1)["matches"]] == ["b"]
+
+
+def test_failed_log_write_is_not_replayed(tmp_path):
+    path = str(tmp_path / "idx")
+    index = _InMemoryIndex("idx", 8, path=path)
+    index.upsert([("a", _unit(0), _meta(0))])
+
+    raw = index._meta_file
+    index._meta_file = _FailingWrites(raw)
+    with pytest.raises(OSError):
+        index.upsert([("c", _unit(2), _meta(2))])
+    index._meta_file = raw
+
+    index.upsert([("b", _unit(1), _meta(1))])
+    index.close()
+
+    reopened = _InMemoryIndex("idx", 8, path=path)
+    assert [m["id"] for m in reopened.query(_unit(1), top_k=1)["matches"]] == ["b"]
+    assert reopened.fetch(["c"])["vectors"] == {}
+    assert sorted(reopened.fetch(["a", "b"])["vectors"]) == ["a", "b"]
@@ -0,0 +1,32 @@
+import numpy as np
+
+from backend.app.core.config import settings
+from backend.app.services.query_cache import SemanticQueryCache
+from backend.app.services.vector_db import KBType
+
+
+def _vector():
+    vector = np.zeros(512, dtype=np.float32)
+    vector[0] = 1.0
+    return vector
+
+
+def test_answer_computed_before_invalidate_is_not_stored():
+    cache = SemanticQueryCache(settings)
+    generation = cache.generation(KBType.SKB, "user")
+    # An upload lands while the pipeline is still answering
+    cache.invalidate(KBType.SKB, "user")
+    cache.set(_vector(), KBType.SKB, "user", {"answer": "stale"}, generation)
+    assert cache.get(_vector(), KBType.SKB, "user") is None
+
+    cache.set(_vector(), KBType.SKB, "user", {"answer": "fresh"}, cache.generation(KBType.SKB, "user"))
+    assert cache.get(_vector(), KBType.SKB, "user") == {"answer": "fresh"}
+
+
+def test_invalidate_only_touches_its_scope():
+    cache = SemanticQueryCache(settings)
+    for context_id in ("a", "b"):
+        cache.set(_vector(), KBType.SKB, context_id, {"answer": context_id}, cache.generation(KBType.SKB, context_id))
+    cache.invalidate(KBType.SKB, "a")
+    assert cache.get(_vector(), KBType.SKB, "a") is None
+    assert cache.get(_vector(), KBType.SKB, "b") == {"answer": "b"}
@@ -0,0 +1,54 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.app.services.rag_pipeline import RAGPipelineService
+from backend.app.services.vector_db import KBType
+
+
+class _Embeddings:
+    def create_text_embedding(self, query: str) -> np.ndarray:
+        if query == "bad":
+            raise ValueError("cannot embed")
+        return np.ones(512, dtype=np.float32)
+
+    def create_text_embeddings_batch(self, queries: list[str]) -> list[np.ndarray]:
+        return [self.create_text_embedding(query) for query in queries]
+
+
+class _VectorDB:
+    async def aquery(self, vector, kb_type, context_id=None, top_k=5):
+        return [{"id": "match", "score": 1.0, "metadata": {}}]
+
+
+class _Storage:
+    is_enabled = False
+    bucket_name = "bucket"
+
+
+class _Generator:
+    def generate_response(self, query, context_items):
+        return f"answer to {query}"
+
+
+def test_one_bad_query_does_not_fail_its_batch():
+    pipeline = RAGPipelineService(_Embeddings(), _VectorDB(), _Storage(), _Generator())
+    results = asyncio.run(pipeline.run_pipeline_batch(["a", "bad", "c"], KBType.GKB, return_exceptions=True))
+    assert results[0]["answer"] == "answer to a"
+    assert isinstance(results[1], ValueError)
+    assert results[2]["answer"] == "answer to c"
+
+
+def test_cancelled_context_fetch_is_not_used_as_context():
+    class _EnabledStorage(_Storage):
+        is_enabled = True
+
+    class _CancellingPipeline(RAGPipelineService):
+        async def _fetch_context(self, match):
+            raise asyncio.CancelledError()
+
+    pipeline = _CancellingPipeline(_Embeddings(), _VectorDB(), _EnabledStorage(), _Generator())
+    matches = [{"id": "match", "score": 1.0, "metadata": {}}]
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(pipeline._retrieve_context(matches))
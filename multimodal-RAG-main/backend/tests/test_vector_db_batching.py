@@ -0,0 +1,40 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services.vector_db import KBType, VectorDBService
+
+
+@pytest.fixture
+def service():
+    service = VectorDBService(settings)
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        kb_type = KBType.SKB if i % 2 else KBType.GKB
+        service.upsert(rng.standard_normal(512).astype(np.float32), kb_type, "text", f"s3://bucket/{i}", context_id=f"user{i % 3}")
+    return service
+
+
+def test_concurrent_aqueries_match_query(service):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((24, 512)).astype(np.float32)
+    kb_types = [KBType.SKB if i % 2 else KBType.GKB for i in range(len(vectors))]
+
+    async def run():
+        return await asyncio.gather(*(
+            service.aquery(vector, kb_type, "user1", top_k=3) for vector, kb_type in zip(vectors, kb_types)
+        ))
+
+    results = asyncio.run(run())
+    for vector, kb_type, matches in zip(vectors, kb_types, results):
+        expected = service.query(vector, kb_type, "user1", top_k=3)
+        assert [m["id"] for m in matches] == [m["id"] for m in expected]
+
+
+def test_batchers_do_not_outlive_their_loop(service):
+    vector = np.ones(512, dtype=np.float32)
+    for _ in range(5):
+        assert asyncio.run(service.aquery(vector, KBType.GKB, top_k=1))
+    assert service._batchers == {}
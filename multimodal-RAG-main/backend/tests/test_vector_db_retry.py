@@ -0,0 +1,99 @@
+import grpc
+import numpy as np
+import pytest
+from grpc.aio import AioRpcError, Metadata
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError, ReadTimeoutError
+
+from backend.app.core.config import settings
+from backend.app.services.vector_db import KBType, VectorDBService, _is_transient
+
+try:
+    from pinecone.exceptions import PineconeException
+except ImportError:
+    class PineconeException(Exception):
+        pass
+
+
+def _rpc_error(code: grpc.StatusCode) -> AioRpcError:
+    return AioRpcError(code, Metadata(), Metadata(), details="test")
+
+
+def _wrapped_by_pinecone(cause: BaseException) -> PineconeException:
+    # The gRPC client re-raises RpcErrors as PineconeException(...) from the original
+    try:
+        raise PineconeException("wrapped") from cause
+    except PineconeException as e:
+        return e
+
+
+class _ApiError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionError("reset"),
+    TimeoutError("timed out"),
+    MaxRetryError(None, "/query", reason=NewConnectionError(None, "refused")),
+    NewConnectionError(None, "refused"),
+    ReadTimeoutError(None, "/query", "read timed out"),
+    ProtocolError("Connection aborted."),
+    _ApiError(429),
+    _ApiError(503),
+    _rpc_error(grpc.StatusCode.UNAVAILABLE),
+    _rpc_error(grpc.StatusCode.DEADLINE_EXCEEDED),
+    _rpc_error(grpc.StatusCode.RESOURCE_EXHAUSTED),
+    _wrapped_by_pinecone(_rpc_error(grpc.StatusCode.UNAVAILABLE)),
+])
+def test_transient_errors_are_retried(error):
+    assert _is_transient(error)
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("bad vector"),
+    _ApiError(400),
+    _ApiError(401),
+    _rpc_error(grpc.StatusCode.INVALID_ARGUMENT),
+    _wrapped_by_pinecone(_rpc_error(grpc.StatusCode.NOT_FOUND)),
+    PineconeException("no cause"),
+])
+def test_permanent_errors_are_not_retried(error):
+    assert not _is_transient(error)
+
+
+class _FlakyIndex:
+    def __init__(self, error: BaseException, failures: int):
+        self.error = error
+        self.failures = failures
+        self.calls = 0
+
+    def query(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return {"matches": []}
+
+
+def test_query_retries_until_success():
+    service = VectorDBService(settings)
+    service.index = _FlakyIndex(_wrapped_by_pinecone(_rpc_error(grpc.StatusCode.UNAVAILABLE)), failures=2)
+    assert service.query(np.ones(512, dtype=np.float32), KBType.GKB) == []
+    assert service.index.calls == 3
+
+
+def test_query_gives_up_with_original_error():
+    service = VectorDBService(settings)
+    error = ReadTimeoutError(None, "/query", "read timed out")
+    service.index = _FlakyIndex(error, failures=5)
+    with pytest.raises(ReadTimeoutError):
+        service.query(np.ones(512, dtype=np.float32), KBType.GKB)
+    assert service.index.calls == 3
+
+
+def test_permanent_error_is_raised_immediately():
+    service = VectorDBService(settings)
+    service.index = _FlakyIndex(_ApiError(400), failures=5)
+    with pytest.raises(_ApiError):
+        service.query(np.ones(512, dtype=np.float32), KBType.GKB)
+    assert service.index.calls == 1